@@ -0,0 +1,218 @@
+"""
+Aggregated, columnar cache of the emoji usage dataset.
+
+The CSV is streamed in chunks into a count cube: one row per distinct
+(emoji, context, platform, gender, age) with the number of usages, so memory
+depends on the number of distinct keys and not on the number of rows. The cube
+is stored as a directory of NumPy arrays (dictionary codes per categorical
+column, an int8 age column and an int64 count column) with the category labels
+and the ingested sources in meta.json. Loading memory maps the arrays. When a
+source is newer than the cache the cube is rebuilt from the sources.
+
+    python dataset.py                 # (re)build the cache
+    python dataset.py append new.csv  # add the rows of new.csv to the cube
+"""
+import json
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # folder containing dataset.py
+CSV_PATH = os.path.join(BASE_DIR, "data", "emoji_usage_dataset.csv")
+CACHE_DIR = os.path.join(BASE_DIR, "data", "cache")
+
+# Logical describer -> dataset column
+SCHEMA = {
+    "emoji": "Emoji",
+    "context": "Context",
+    "platform": "Platform",
+    "age": "User Age",
+    "gender": "User Gender",
+}
+
+CACHE_VERSION = 3  # 3: rows with blank fields are kept
+CATEGORY_COLUMNS = [SCHEMA[d] for d in ("emoji", "context", "platform", "gender")]
+AGE_COLUMN = SCHEMA["age"]
+CUBE_COLUMNS = list(SCHEMA.values())
+COUNT = "count"
+
+CHUNK_ROWS = 500_000  # rows read from a CSV at a time
+MERGE_EVERY = 8  # partial cubes kept before they are merged
+
+
+def source_signature(csv_path: str = CSV_PATH):
+    """
+    Identifies a version of a CSV: (mtime in ns, size in bytes)
+    """
+    st = os.stat(csv_path)
+    return (st.st_mtime_ns, st.st_size)
+
+def cache_signature(csv_path: str = CSV_PATH, cache_dir: str = CACHE_DIR):
+    """
+    Changes whenever the main CSV or the stored cube change
+    """
+    try:
+        meta_mtime = os.stat(os.path.join(cache_dir, "meta.json")).st_mtime_ns
+    except OSError:
+        meta_mtime = None
+    return source_signature(csv_path) + (meta_mtime,)
+
+def _array_path(cache_dir: str, column: str):
+    return os.path.join(cache_dir, column.lower().replace(" ", "_") + ".npy")
+
+
+# ---- Aggregation ---- #
+def _merge(parts):
+    if len(parts) == 1:
+        return parts[0]
+    levels = list(range(len(CUBE_COLUMNS)))
+    return pd.concat(parts).groupby(level=levels, sort=False, dropna=False).sum()
+
+def aggregate_csv(csv_path: str, counts=None, chunksize: int = CHUNK_ROWS):
+    """
+    Streams `csv_path` in chunks and returns the usage count per distinct key as a
+    Series indexed by CUBE_COLUMNS, added to `counts` when given
+    """
+    parts = [] if counts is None else [counts]
+    for chunk in pd.read_csv(csv_path, usecols=CUBE_COLUMNS, chunksize=chunksize):
+        # Rows with a blank field still count for the rest of their fields
+        parts.append(chunk.groupby(CUBE_COLUMNS, sort=False, dropna=False).size())
+        if len(parts) >= MERGE_EVERY:
+            parts = [_merge(parts)]
+    if not parts:
+        empty = pd.MultiIndex.from_arrays([[] for _ in CUBE_COLUMNS], names=CUBE_COLUMNS)
+        return pd.Series([], index=empty, dtype=np.int64)
+    return _merge(parts)
+
+def _to_cube(counts):
+    cube = counts.rename(COUNT).reset_index()
+    cube = cube.astype({col: "category" for col in CATEGORY_COLUMNS})
+    cube[COUNT] = cube[COUNT].astype(np.int64)
+    # Ages fit in a byte, anything else is kept as it is
+    if len(cube) and cube[AGE_COLUMN].between(-128, 127).all():
+        cube[AGE_COLUMN] = cube[AGE_COLUMN].astype(np.int8)
+    return cube
+
+def _to_counts(cube):
+    columns = {col: cube[col].astype(object) if col in CATEGORY_COLUMNS else cube[col] for col in CUBE_COLUMNS}
+    index = pd.MultiIndex.from_arrays(list(columns.values()), names=CUBE_COLUMNS)
+    return pd.Series(cube[COUNT].to_numpy(np.int64), index=index, name=COUNT)
+
+
+# ---- Storage ---- #
+def _save_cube(cube, sources: list, cache_dir: str):
+    os.makedirs(cache_dir, exist_ok=True)
+    meta = {
+        "version": CACHE_VERSION,
+        "sources": sources,
+        "keys": len(cube),
+        "rows": int(cube[COUNT].sum()),
+        "columns": cube.columns.tolist(),
+        "categories": {},
+    }
+    for col in CATEGORY_COLUMNS:
+        np.save(_array_path(cache_dir, col), cube[col].cat.codes.to_numpy())
+        meta["categories"][col] = cube[col].cat.categories.tolist()
+    for col in (AGE_COLUMN, COUNT):
+        np.save(_array_path(cache_dir, col), cube[col].to_numpy())
+
+    # meta.json goes last, so a half written cache is never taken as valid
+    meta_path = os.path.join(cache_dir, "meta.json")
+    with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(meta_path + ".tmp", meta_path)
+
+def _read_meta(cache_dir: str):
+    try:
+        with open(os.path.join(cache_dir, "meta.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _load_cube(meta: dict, cache_dir: str):
+    columns = {}
+    for col in meta["columns"]:
+        values = np.load(_array_path(cache_dir, col), mmap_mode="r")
+        if col in meta["categories"]:
+            values = pd.Categorical.from_codes(values, categories=meta["categories"][col])
+        columns[col] = values
+    return pd.DataFrame(columns, columns=meta["columns"], copy=False)
+
+def _is_fresh(meta, csv_path: str):
+    if not meta or meta.get("version") != CACHE_VERSION or not meta.get("sources"):
+        return False
+    if meta["sources"][0]["path"] != os.path.abspath(csv_path):
+        return False
+    for source in meta["sources"]:
+        try:
+            if [source["mtime_ns"], source["size"]] != list(source_signature(source["path"])):
+                return False
+        except OSError:
+            return False
+    return True
+
+def _source_entry(path: str):
+    mtime_ns, size = source_signature(path)
+    return {"path": os.path.abspath(path), "mtime_ns": mtime_ns, "size": size}
+
+
+# ---- Public API ---- #
+def build_cache(csv_path: str = CSV_PATH, cache_dir: str = CACHE_DIR, extra_sources: list = ()):
+    """
+    Aggregates `csv_path` (and any previously appended CSVs) into the cube cache
+    and returns the cube
+    """
+    paths = [csv_path] + [p for p in extra_sources if os.path.exists(p)]
+    sources = [_source_entry(p) for p in paths]
+    counts = None
+    for path in paths:
+        counts = aggregate_csv(path, counts)
+    cube = _to_cube(counts)
+    _save_cube(cube, sources, cache_dir)
+    return cube
+
+def append_csv(path: str, csv_path: str = CSV_PATH, cache_dir: str = CACHE_DIR):
+    """
+    Adds the rows of another CSV to the cube without re-reading the sources
+    already ingested
+    """
+    cube = load_cube(csv_path, cache_dir)
+    meta = _read_meta(cache_dir)
+    sources = meta["sources"] if meta else [_source_entry(csv_path)]
+    if any(source["path"] == os.path.abspath(path) for source in sources):
+        raise ValueError(f"{path} was already ingested")
+    entry = _source_entry(path)
+    cube = _to_cube(aggregate_csv(path, _to_counts(cube)))
+    _save_cube(cube, sources + [entry], cache_dir)
+    return cube
+
+def load_cube(csv_path: str = CSV_PATH, cache_dir: str = CACHE_DIR):
+    """
+    Returns the count cube, from the cache when it matches the sources on disk,
+    otherwise rebuilt from the sources
+    """
+    meta = _read_meta(cache_dir)
+    if _is_fresh(meta, csv_path):
+        try:
+            return _load_cube(meta, cache_dir)
+        except (OSError, ValueError, KeyError):
+            pass  # Damaged cache, rebuild it
+    extra = [source["path"] for source in meta["sources"][1:]] if meta and meta.get("sources") else []
+    try:
+        return build_cache(csv_path, cache_dir, extra)
+    except OSError:
+        # Read only install, aggregate in memory only
+        counts = None
+        for path in [csv_path] + [p for p in extra if os.path.exists(p)]:
+            counts = aggregate_csv(path, counts)
+        return _to_cube(counts)
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "append":
+        cube = append_csv(sys.argv[2])
+    elif len(sys.argv) == 1:
+        cube = build_cache()
+    else:
+        sys.exit("usage: python dataset.py [append <file.csv>]")
+    print(f"Cube has {len(cube)} keys for {int(cube[COUNT].sum())} rows, stored in {CACHE_DIR}")
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List, Union
+from typing import Optional, List, Union, Literal
 
 class EmojiUsage(BaseModel):
     context : Optional[str] = None
@@ -8,6 +8,12 @@ class EmojiUsage(BaseModel):
     gender : Optional[str] = None
     
 class Interpretation(BaseModel):
+    emoji : Optional[str] = None
     entries_amount : int = 0
     type : str = ""
-    result : List[Union[str, float]] = []
\ No newline at end of file
+    result : List[Union[str, float]] = []
+
+class EmojiQuery(BaseModel):
+    emoji : str
+    attributes : List[Literal["context", "platform", "gender", "popularity"]] = ["context", "platform", "gender", "popularity"]
+    info : EmojiUsage = EmojiUsage()
\ No newline at end of file
@@ -1,166 +1,277 @@
-import pandas as pd
-from model import EmojiUsage, Interpretation
-import os
+from itertools import combinations
+from functools import lru_cache
+from model import EmojiUsage, Interpretation, EmojiQuery
+import dataset
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # folder containing resources.py
-CSV_PATH = os.path.join(BASE_DIR, "data", "emoji_usage_dataset.csv")
+SCHEMA = dataset.SCHEMA
+EMOJI = SCHEMA["emoji"]
+# Describers that can narrow a query, in the order they are applied
+FILTER_COLUMNS = [(d, SCHEMA[d]) for d in ("age", "context", "platform", "gender")]
+# Columns a query can ask about
+TARGET_COLUMNS = [SCHEMA[d] for d in ("context", "platform", "gender")]
+# Query type -> (column asked about, number of values returned)
+QUERY_TARGETS = {
+    "context": (SCHEMA["context"], 2),
+    "platform": (SCHEMA["platform"], 2),
+    "gender": (SCHEMA["gender"], 1),
+}
 
-df = pd.read_csv(CSV_PATH)
+# Answers kept in the query cache
+CACHE_SIZE = 4096
+
+# Count cube of the dataset (see dataset.py), loaded on first use by _refresh_if_changed
+cube = None
+index = None
+vocabulary = None
+_signature = None
+_reloads = 0
 
 # ---- Dataset description ---- #
+class Vocabulary():
+    """
+    Values of every describer, built once per load: sorted tuples for listing
+    and frozensets for O(1) validation
+    """
+    def __init__(self, cube):
+        self.values = {}
+        self.sets = {}
+        for describer, col in SCHEMA.items():
+            values = cube[col].dropna().unique().tolist()  # blanks are not values
+            self.values[describer] = tuple(sorted(values))
+            self.sets[describer] = frozenset(values)
+
 def get_contexts():
     """
     Returns list of possible contexts or feelings associated to an emoji
     """
-    return df["Context"].unique().tolist()
+    _refresh_if_changed()
+    return list(vocabulary.values["context"])
     
 def get_platforms():
     """
     Returns list of possible sentiments in an emoji
     """
-    return df["Platform"].unique().tolist()
+    _refresh_if_changed()
+    return list(vocabulary.values["platform"])
+
+def get_genders():
+    """
+    Returns list of possible user genders in the dataset
+    """
+    _refresh_if_changed()
+    return list(vocabulary.values["gender"])
 
 def get_describers():
     """
     Returns possible characteristics or describers that are associated to an emoji
     """
-    return df.columns.to_list()
+    return [d for d in SCHEMA if d != "emoji"]
     
 def is_valid_emoji(emoji: str = ""):
     """
     Returns a boolean value if a given emoji exists in the dataest
     """
-    return df["Emoji"].isin([emoji]).any()
+    _refresh_if_changed()
+    return emoji in vocabulary.sets["emoji"]
 
 
-# ---- Get emoji info ---- #
-def apply_info(df, em_use: EmojiUsage, min_entries = 2):
-    info = df.copy()
-    # Apply use
-    if em_use.age:
-        filtered  = info[
-            (info["User Age"] > em_use.age -1) & 
-            (info["User Age"] < em_use.age +1)
-        ]
-        if (len(filtered)>min_entries):
-            info = filtered
-    # Context
-    if em_use.context:
-        filtered = info[
-            (info["Context"] == em_use.context)
-        ]
-        if (len(filtered)>min_entries):
-            info = filtered
-    # Platform
-    if em_use.platform:
-        filtered = info[
-            (info["Platform"] == em_use.platform)
-        ]
-        if (len(filtered)>min_entries):
-            info = filtered
-    # Gender
-    if em_use.gender:
-        filtered = info[
-            (info["Gender"] == em_use.gender)
-        ]
-        if (len(filtered)>min_entries):
-            info = filtered
-    return info
+# ---- Query index ---- #
+def _as_key(key):
+    return key if isinstance(key, tuple) else (key,)
 
-def get_context_from_emoji(emoji: str, info : dict):
-    """ 
-    Returns a list of the possible context or feeling associated to a valid emoji usage
-    including the use of optional describers for EmojiUsage.
+def _size_table(cube, columns):
+    """
+    Number of rows for every combination of values of `columns`
+    """
+    if not columns:
+        return {(): int(cube[dataset.COUNT].sum())}
+    sizes = cube.groupby(list(columns), sort=False, observed=True)[dataset.COUNT].sum()
+    return dict(zip(map(_as_key, sizes.index.tolist()), sizes.tolist()))
+
+def _ranked_table(cube, columns, target):
+    """
+    Values of `target` ordered from most to least frequent, for every combination
+    of values of `columns`
+    """
+    sizes = cube.groupby(list(columns) + [target], sort=False, observed=True)[dataset.COUNT].sum()
+    sizes = sizes.sort_values(ascending=False, kind="stable")
+    ranked = {}
+    for k in map(_as_key, sizes.index.tolist()):
+        ranked.setdefault(k[:-1], []).append(k[-1])
+    return ranked
+
+class EmojiIndex():
     """
+    Row counts precomputed at load time for every combination of describers, so
+    a query is a few dict lookups. Built from the count cube, so its size depends on
+    the number of distinct keys, not on the number of rows.
+        counts[columns][values] -> rows having those values
+        ranked[(columns, target)][values] -> values of target, most frequent first
+    Ages are whole years and are matched exactly.
+    """
+    def __init__(self, cube):
+        self.counts = {}
+        self.ranked = {}
+        filter_columns = [col for _, col in FILTER_COLUMNS]
+        for r in range(len(filter_columns) + 1):
+            for columns in combinations(filter_columns, r):
+                for keys in (columns, columns + (EMOJI,)):
+                    self.counts[keys] = _size_table(cube, keys)
+                for target in [EMOJI] + TARGET_COLUMNS:
+                    keys = columns if target == EMOJI else columns + (EMOJI,)
+                    if target not in keys:
+                        self.ranked[(keys, target)] = _ranked_table(cube, keys, target)
+
+    def resolve(self, em_use: EmojiUsage, min_entries = 2):
+        """
+        Describers that end up applied for `em_use`: each one is kept only when it still
+        leaves more than `min_entries` rows, in the order of FILTER_COLUMNS.
+        Returns (columns, values).
+        """
+        columns, values = (), ()
+        for field, col in FILTER_COLUMNS:
+            value = getattr(em_use, field)
+            if not value:
+                continue
+            if self.count(columns + (col,), values + (value,)) > min_entries:
+                columns, values = columns + (col,), values + (value,)
+        return columns, values
+
+    def count(self, columns, values):
+        return self.counts[columns].get(values, 0)
+
+    def top(self, columns, values, target, n):
+        if target in columns:
+            # Already filtered on target, the only possible value is the filter
+            return [values[columns.index(target)]] if self.count(columns, values) else []
+        return self.ranked[(columns, target)].get(values, [])[:n]
+
+# ---- Dataset reload and query cache ---- #
+def _refresh_if_changed():
+    """
+    Loads the dataset on first use, and reloads it dropping every cached answer
+    when the CSV or the stored cube changed on disk
+    """
+    global cube, index, vocabulary, _signature, _reloads
+    signature = dataset.cache_signature()
+    if signature == _signature:
+        return
+    cube = dataset.load_cube()
+    index = EmojiIndex(cube)
+    vocabulary = Vocabulary(cube)
+    if _signature is not None:
+        _reloads += 1
+    # Loading may have rebuilt the cache, take the signature afterwards
+    _signature = dataset.cache_signature()
+    _answer.cache_clear()
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _answer(type: str, emoji: str, usage: tuple):
+    """
+    (entries_amount, result) of a query. `usage` is the normalized EmojiUsage as a
+    tuple of items, so equal queries share one cache entry.
+    """
+    columns, values = index.resolve(EmojiUsage(**dict(usage)))
+    if type == "predict":
+        return 0, tuple(index.top(columns, values, EMOJI, 5))
+    # Search emoji
+    emoji_columns, emoji_values = columns + (EMOJI,), values + (emoji,)
+    entries = index.count(emoji_columns, emoji_values)
+    if type == "popularity":
+        # Share of the applied rows that use this emoji
+        return entries, (entries / index.count(columns, values),)
+    target, n = QUERY_TARGETS[type]
+    return entries, tuple(index.top(emoji_columns, emoji_values, target, n))
+
+def _cached_answer(type: str, emoji: str, em_use: EmojiUsage):
+    _refresh_if_changed()
+    return _answer(type, emoji, tuple(em_use.model_dump().items()))
+
+def get_cache_stats():
+    """
+    Returns hit/miss counters of the query cache and the dataset version it serves
+    """
+    _refresh_if_changed()
+    info = _answer.cache_info()
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "maxsize": info.maxsize,
+        "reloads": _reloads,
+        "dataset_mtime_ns": _signature[0],
+        "dataset_size": _signature[1],
+        "dataset_rows": index.count((), ()),
+        "distinct_keys": len(cube),
+    }
+
+
+# ---- Get emoji info ---- #
+def _interpret(emoji: str, info: dict, type: str):
     # Parse
     emoji_usage = EmojiUsage(**info)
-    # Search emoji
-    df_applied = apply_info(df, emoji_usage)
-    df_emoji = df_applied[df_applied["Emoji"] == emoji]
-    # Get most likely context
-    rslt = df_emoji["Context"].value_counts().head(2).index.tolist()
-    
+    entries, result = _cached_answer(type, emoji, emoji_usage)
     # Interpretation
     int_dict = {
-        "entries_amount": len(df_emoji),
-        "type": "context",
-        "result": rslt
+        "emoji": emoji,
+        "entries_amount": entries,
+        "type": type,
+        "result": list(result)
     }
-    interp = Interpretation(**int_dict)
-    return interp
+    return Interpretation(**int_dict)
+
+def get_context_from_emoji(emoji: str, info : dict):
+    """ 
+    Returns a list of the possible context or feeling associated to a valid emoji usage
+    including the use of optional describers for EmojiUsage.
+    """
+    return _interpret(emoji, info, "context")
     
 def get_platform_from_emoji(emoji: str, info : dict):
     """ 
     Returns a list of the possible social media platform associated to a valid emoji usage
     including the use of optional describers for EmojiUsage.
     """
-    # Parse
-    emoji_usage = EmojiUsage(**info)
-    # Search emoji
-    df_applied = apply_info(df, emoji_usage)
-    df_emoji = df_applied[df_applied["Emoji"] == emoji]
-    # Get most likely context
-    rslt = df_emoji["Platform"].value_counts().head(2).index.tolist()
-    
-    # Interpretation
-    int_dict = {
-        "entries_amount": len(df_emoji),
-        "type": "platform",
-        "result": rslt
-    }
-    interp = Interpretation(**int_dict)
-    return interp
+    return _interpret(emoji, info, "platform")
 
 def get_gender_from_emoji(emoji: str, info : dict):
     """ 
     Returns a list of the possible gender identity associated to a valid emoji usage
     including the use of optional describers for EmojiUsage.
     """
-    # Parse
-    emoji_usage = EmojiUsage(**info)
-    # Search emoji
-    df_applied = apply_info(df, emoji_usage)
-    df_emoji = df_applied[df_applied["Emoji"] == emoji]
-    # Get most likely context
-    rslt = df_emoji["Gender"].value_counts().head(1).index.tolist()
-    
-    # Interpretation
-    int_dict = {
-        "entries_amount": len(df_emoji),
-        "type": "gender",
-        "result": rslt
-    }
-    interp = Interpretation(**int_dict)
-    return interp
+    return _interpret(emoji, info, "gender")
 
 def get_popularity_from_emoji(emoji: str, info : dict):
     """ 
     Returns a list of the possible popularity given certain charactersitics,
     associated to a valid emoji usage, including the use of optional describers for EmojiUsage.
     """
-    # Parse
-    emoji_usage = EmojiUsage(**info)
-    # Search emoji
-    df_applied = apply_info(df, emoji_usage)
-    df_emoji = df_applied[df_applied["Emoji"] == emoji]
-    # Get most likely context
-    rslt = len(df_emoji)/len(df_applied)
-    
-    # Interpretation
-    int_dict = {
-        "entries_amount": len(df_emoji),
-        "type": "popularity",
-        "result": rslt
-    }
-    interp = Interpretation(**int_dict)
-    return interp
+    return _interpret(emoji, info, "popularity")
+
+
+def batch_query(queries: list[EmojiQuery]):
+    """
+    Answers every (emoji, attribute) pair of `queries` in one call, in order.
+    Describers are resolved once per distinct info and shared through the query cache.
+    """
+    _refresh_if_changed()
+    results = []
+    for query in queries:
+        usage = tuple(query.info.model_dump().items())
+        for type in query.attributes:
+            entries, result = _answer(type, query.emoji, usage)
+            results.append(Interpretation(
+                emoji=query.emoji,
+                entries_amount=entries,
+                type=type,
+                result=list(result)
+            ))
+    return results
 
 
 # ---- Get emoji info ---- #
 def predict_emoji(info: EmojiUsage):
-    df_applied = apply_info(df, info)
-    emojis = df_applied["Emoji"].value_counts(normalize=True).index.tolist()
-    return emojis[:5]
+    return list(_cached_answer("predict", "", info)[1])
     
 if __name__ == "__main__":
     predict_emoji(
@@ -1,5 +1,5 @@
 from mcp.server.fastmcp import FastMCP
-from model import EmojiUsage, Interpretation
+from model import EmojiUsage, Interpretation, EmojiQuery
 import resources as res_tools
 # Create an MCP server
 mcp = FastMCP("EmojiUsage")
@@ -26,6 +26,13 @@ def get_possible_platforms():
     """
     return res_tools.get_platforms()
 
+@mcp.tool()
+def get_possible_genders():
+    """
+    Returns list of possible user genders recognized in the emoji usage dataset.
+    """
+    return res_tools.get_genders()
+
 @mcp.tool()
 def is_valid_emoji(emoji: str):
     """
@@ -64,6 +71,24 @@ def get_gender_from_emoji(emoji: str, info:dict):
     int_obj = res_tools.get_gender_from_emoji(emoji, info)
     return int_obj
 
+# Several emojis and attributes in one call
+@mcp.tool()
+def batch_emoji_query(queries: list[EmojiQuery]) -> list[Interpretation]:
+    """
+    Answers several emoji questions in one call. Each query has an emoji, the attributes
+    wanted (context, platform, gender, popularity) and optional describers in `info`.
+    Returns one Interpretation per (emoji, attribute), in the order requested.
+    """
+    return res_tools.batch_query(queries)
+
+# ---- Cache ---- #
+@mcp.tool()
+def get_cache_stats():
+    """
+    Returns hit/miss counters of the emoji query cache and the dataset version it serves.
+    """
+    return res_tools.get_cache_stats()
+
 # ---- Emoji Usage ---- #
 @mcp.tool(name="get_appropriate_emoji")
 def get_appropriate_emoji(query: EmojiUsage) -> list[str]:
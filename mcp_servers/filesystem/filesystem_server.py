@@ -5,9 +5,24 @@ Provides tools for reading, writing, and managing files and directories.
 """
 
 import os
+import re
 import sys
 import json
+import mmap
+import time
+import atexit
+import base64
+import bisect
 import asyncio
+import secrets
+import tempfile
+import functools
+import threading
+import multiprocessing
+from array import array
+from stat import S_ISDIR, S_ISREG
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from pathlib import Path
 from typing import List, Dict, Any, Optional
 from mcp.server.fastmcp import FastMCP
@@ -22,81 +37,470 @@ ALLOWED_ROOTS = [
     Path("/tmp") if os.name != "nt" else Path.cwd() / "temp",  # Temp directory
 ]
 
+_root_prefixes = None  # (ALLOWED_ROOTS it was built from, resolved prefixes)
+
+def _allowed_prefixes() -> tuple:
+    """ALLOWED_ROOTS resolved once (again only if the list changes) into normalized prefixes"""
+    global _root_prefixes
+    roots = tuple(ALLOWED_ROOTS)
+    if _root_prefixes is None or _root_prefixes[0] != roots:
+        prefixes = set()
+        for root in roots:
+            try:
+                resolved = os.path.normcase(str(root.resolve()))
+            except (OSError, RuntimeError):
+                continue
+            prefixes.add(resolved if resolved.endswith(os.sep) else resolved + os.sep)
+        _root_prefixes = (roots, tuple(sorted(prefixes)))
+    return _root_prefixes[1]
+
+def _is_allowed_resolved(path: Path) -> bool:
+    # path + separator keeps /tmpx from passing as /tmp
+    return (os.path.normcase(str(path)) + os.sep).startswith(_allowed_prefixes())
+
 def is_path_allowed(file_path: str) -> bool:
     """Check if the given path is within allowed directories"""
     try:
-        path = Path(file_path).resolve()
-        for root in ALLOWED_ROOTS:
-            try:
-                path.relative_to(root.resolve())
-                return True
-            except ValueError:
-                continue
-        return False
+        return _is_allowed_resolved(Path(file_path).resolve())
     except Exception:
         return False
 
 def safe_path(file_path: str) -> Path:
     """Get a safe path object, raising error if not allowed"""
-    if not is_path_allowed(file_path):
+    path = Path(file_path).resolve()
+    if not _is_allowed_resolved(path):
         raise ValueError(f"Access denied: Path '{file_path}' is outside allowed directories")
-    return Path(file_path).resolve()
+    return path
+
+# Blocking disk work runs on a worker pool so the server keeps answering meanwhile
+WORKER_THREADS = 8
+SEARCH_CALLS = 2  # directory walks allowed at once
+
+_executor = ThreadPoolExecutor(max_workers=WORKER_THREADS, thread_name_prefix="fs-tool")
+_tool_limits: Dict[str, asyncio.Semaphore] = {}
+
+async def _run_limited(name: str, limit: int, fn, /, *args, **kwargs):
+    limit_sem = _tool_limits.setdefault(name, asyncio.Semaphore(limit))
+    async with limit_sem:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+def concurrent_tool(limit: int = WORKER_THREADS):
+    """
+    Run a blocking tool on the worker pool, with at most `limit` calls of it at once.
+    A cancelled call returns right away; the disk operation it started finishes in the background.
+    """
+    def wrap(fn):
+        @functools.wraps(fn)
+        async def tool(*args, **kwargs):
+            return await _run_limited(fn.__name__, limit, fn, *args, **kwargs)
+        return tool
+    return wrap
+
+class ToolError(Exception):
+    """Expected failure of a tool helper; the tool shows it as "Error: <message>"."""
+
+# Reads
+MAX_READ_BYTES = 1024 * 1024  # biggest text returned by a single read_file call
+LINE_BLOCK = 64 * 1024  # bytes per block of the line index
+LINE_INDEX_FILES = 32  # files whose line index is kept
+
+class LineIndex:
+    """
+    Number of newlines before every LINE_BLOCK-byte block of a file, counted once.
+    Finding where a line starts is a binary search over the blocks plus a scan of
+    a single block.
+    """
+    def __init__(self, mm: mmap.mmap):
+        self.newlines_before = array("Q", [0])
+        total = 0
+        for start in range(0, len(mm), LINE_BLOCK):
+            total += mm[start:start + LINE_BLOCK].count(b"\n")
+            self.newlines_before.append(total)
+
+    def line_start(self, mm: mmap.mmap, line: int) -> int:
+        """Byte offset where the 0-based `line` starts, the file size past the last line"""
+        if line <= 0:
+            return 0
+        if line > self.newlines_before[-1]:
+            return len(mm)
+        block = bisect.bisect_left(self.newlines_before, line) - 1
+        pos = block * LINE_BLOCK - 1
+        for _ in range(line - self.newlines_before[block]):
+            pos = mm.find(b"\n", pos + 1)
+        return pos + 1
+
+_line_indexes: "OrderedDict[str, tuple]" = OrderedDict()
+_line_indexes_lock = threading.Lock()
+
+def _line_index(path: Path, st: os.stat_result, mm: mmap.mmap) -> LineIndex:
+    # Valid while the file keeps the same mtime and size
+    key, signature = str(path), (st.st_mtime_ns, st.st_size)
+    with _line_indexes_lock:
+        cached = _line_indexes.get(key)
+        if cached and cached[0] == signature:
+            _line_indexes.move_to_end(key)
+            return cached[1]
+    index = LineIndex(mm)
+    with _line_indexes_lock:
+        _line_indexes[key] = (signature, index)
+        _line_indexes.move_to_end(key)
+        while len(_line_indexes) > LINE_INDEX_FILES:
+            _line_indexes.popitem(last=False)
+    return index
+
+def _head_end(mm: mmap.mmap, lines: int) -> int:
+    pos = -1
+    for _ in range(lines):
+        pos = mm.find(b"\n", pos + 1)
+        if pos < 0:
+            return len(mm)
+    return pos + 1
+
+def _tail_start(mm: mmap.mmap, lines: int) -> int:
+    # Walks backwards over the last `lines` lines only
+    pos = len(mm) - 1 if mm[-1:] == b"\n" else len(mm)
+    for _ in range(lines):
+        pos = mm.rfind(b"\n", 0, pos)
+        if pos < 0:
+            return 0
+    return min(pos + 1, len(mm))
+
+def _read_file(file_path: str, encoding: str = "utf-8",
+               offset: Optional[int] = None, length: Optional[int] = None,
+               start_line: Optional[int] = None, end_line: Optional[int] = None,
+               head: Optional[int] = None, tail: Optional[int] = None) -> str:
+    path = safe_path(file_path)
+    if not path.exists():
+        raise ToolError(f"File '{file_path}' does not exist")
+    
+    if not path.is_file():
+        raise ToolError(f"'{file_path}' is not a file")
+    
+    ranges = [
+        offset is not None or length is not None,
+        start_line is not None or end_line is not None,
+        head is not None,
+        tail is not None,
+    ]
+    if sum(ranges) > 1:
+        raise ToolError("use only one of offset/length, start_line/end_line, head or tail")
+    if any(v is not None and v < 0 for v in (offset, length, start_line, end_line, head, tail)):
+        raise ToolError("ranges cannot be negative")
+    
+    if not any(ranges):
+        size = path.stat().st_size
+        if size > MAX_READ_BYTES:
+            raise ToolError(f"'{file_path}' is {size} bytes, read it in parts "
+                            f"with offset/length, start_line/end_line, head or tail")
+        with open(path, 'r', encoding=encoding) as f:
+            return f.read()
+    
+    with open(path, 'rb') as f:
+        st = os.fstat(f.fileno())
+        if st.st_size == 0:
+            return ""
+        
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if head is not None:
+                start, end = 0, _head_end(mm, head)
+            elif tail is not None:
+                start, end = _tail_start(mm, tail), len(mm)
+            elif ranges[1]:
+                index = _line_index(path, st, mm)
+                start = index.line_start(mm, max(1, start_line or 1) - 1)
+                end = len(mm) if end_line is None else max(start, index.line_start(mm, end_line))
+            else:
+                start = min(offset or 0, len(mm))
+                end = len(mm) if length is None else min(start + length, len(mm))
+            
+            if end - start > MAX_READ_BYTES:
+                raise ToolError(f"range is {end - start} bytes, the limit per read is {MAX_READ_BYTES}")
+            # A byte range can cut a character in half
+            errors = "replace" if ranges[0] else "strict"
+            return mm[start:end].decode(encoding, errors=errors)
 
 @mcp.tool()
-def read_file(file_path: str, encoding: str = "utf-8") -> str:
+@concurrent_tool()
+def read_file(file_path: str, encoding: str = "utf-8",
+              offset: Optional[int] = None, length: Optional[int] = None,
+              start_line: Optional[int] = None, end_line: Optional[int] = None,
+              head: Optional[int] = None, tail: Optional[int] = None) -> str:
     """
-    Read the contents of a file.
+    Read the contents of a file, or only part of it.
     
     Args:
         file_path: Path to the file to read
         encoding: Text encoding to use (default: utf-8)
+        offset: First byte to read (byte range, with length)
+        length: Number of bytes to read from offset (default: up to the end)
+        start_line: First line to read, 1-based (line range, with end_line)
+        end_line: Last line to read, inclusive (default: up to the end)
+        head: Read only the first N lines
+        tail: Read only the last N lines
+    
+    Use only one kind of range per call. Without a range the whole file is read;
+    files over 1 MiB must be read by ranges.
     
     Returns:
         File contents as string
     """
     try:
-        path = safe_path(file_path)
-        if not path.exists():
-            return f"Error: File '{file_path}' does not exist"
-        
-        if not path.is_file():
-            return f"Error: '{file_path}' is not a file"
-        
-        with open(path, 'r', encoding=encoding) as f:
-            content = f.read()
-        
-        return content
+        return _read_file(file_path, encoding, offset, length, start_line, end_line, head, tail)
+    except ToolError as e:
+        return f"Error: {e}"
     except Exception as e:
         return f"Error reading file: {str(e)}"
 
+# Writes
+FSYNC_POLICIES = ("none", "file", "full")  # full: also syncs the directory after the rename
+UPLOAD_TTL = 600  # seconds an idle upload is kept
+MAX_UPLOADS = 16
+
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+def _temp_file(path: Path):
+    # In the same directory, so os.replace is atomic
+    return tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".part")
+
+def _sync(f, fsync: str):
+    f.flush()
+    if fsync != "none":
+        os.fsync(f.fileno())
+
+def _publish(temp: str, path: Path, fsync: str):
+    """Moves a finished temp file over `path` in one step, keeping its permissions"""
+    try:
+        mode = os.stat(path).st_mode & 0o7777
+    except FileNotFoundError:
+        mode = 0o666 & ~_UMASK
+    os.chmod(temp, mode)
+    os.replace(temp, path)
+    if fsync == "full" and os.name != "nt":
+        dir_fd = os.open(path.parent, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+def _write_file(file_path: str, content: str, encoding: str = "utf-8", create_dirs: bool = True,
+                fsync: str = "file") -> str:
+    path = safe_path(file_path)
+    if fsync not in FSYNC_POLICIES:
+        raise ToolError(f"fsync must be one of {', '.join(FSYNC_POLICIES)}")
+    
+    if create_dirs:
+        path.parent.mkdir(parents=True, exist_ok=True)
+    
+    fd, temp = _temp_file(path)
+    try:
+        with open(fd, 'w', encoding=encoding) as f:
+            f.write(content)
+            _sync(f, fsync)
+        _publish(temp, path, fsync)
+    except BaseException:
+        os.unlink(temp)
+        raise
+    
+    return f"Successfully wrote {len(content)} characters to '{file_path}'"
+
 @mcp.tool()
-def write_file(file_path: str, content: str, encoding: str = "utf-8", create_dirs: bool = True) -> str:
+@concurrent_tool()
+def write_file(file_path: str, content: str, encoding: str = "utf-8", create_dirs: bool = True,
+               fsync: str = "file") -> str:
     """
-    Write content to a file.
+    Write content to a file. The file is replaced in one step, so readers never
+    see it half written. For large content use open_upload / write_chunk / commit_upload.
     
     Args:
         file_path: Path to the file to write
         content: Content to write to the file
         encoding: Text encoding to use (default: utf-8)
         create_dirs: Whether to create parent directories if they don't exist
+        fsync: "none", "file" (flush the file to disk before replacing) or "full" (also the directory)
     
     Returns:
         Success or error message
     """
+    try:
+        return _write_file(file_path, content, encoding, create_dirs, fsync)
+    except ToolError as e:
+        return f"Error: {e}"
+    except Exception as e:
+        return f"Error writing file: {str(e)}"
+
+class Upload:
+    """A file being written in chunks to a temp file next to its destination"""
+    def __init__(self, path: Path, fsync: str):
+        self.path = path
+        self.fsync = fsync
+        fd, self.temp = _temp_file(path)
+        self.file = open(fd, 'wb')
+        self.size = 0
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+
+    def discard(self):
+        self.file.close()
+        try:
+            os.unlink(self.temp)
+        except FileNotFoundError:
+            pass
+
+_uploads: Dict[str, Upload] = {}
+_uploads_lock = threading.Lock()
+
+def _expire_uploads():
+    now = time.monotonic()
+    with _uploads_lock:
+        expired = [uid for uid, u in _uploads.items() if now - u.last_used > UPLOAD_TTL]
+        expired = [_uploads.pop(uid) for uid in expired]
+    for upload in expired:
+        with upload.lock:
+            upload.discard()
+
+def _take_upload(upload_id: str, remove: bool = False) -> Upload:
+    _expire_uploads()
+    with _uploads_lock:
+        upload = _uploads.pop(upload_id, None) if remove else _uploads.get(upload_id)
+    if upload is None:
+        raise ValueError(f"Unknown or expired upload '{upload_id}'")
+    upload.last_used = time.monotonic()
+    return upload
+
+@atexit.register
+def _discard_uploads():
+    with _uploads_lock:
+        pending = list(_uploads.values())
+        _uploads.clear()
+    for upload in pending:
+        upload.discard()
+
+@mcp.tool()
+@concurrent_tool()
+def open_upload(file_path: str, create_dirs: bool = True, fsync: str = "file") -> str:
+    """
+    Start writing a large file in chunks. Nothing appears at `file_path` until
+    commit_upload; an upload idle for 10 minutes is discarded.
+    
+    Args:
+        file_path: Path of the file to write
+        create_dirs: Whether to create parent directories if they don't exist
+        fsync: "none", "file" (flush the file to disk on commit) or "full" (also the directory)
+    
+    Returns:
+        JSON string with the upload_id to pass to write_chunk / commit_upload / abort_upload
+    """
     try:
         path = safe_path(file_path)
+        if fsync not in FSYNC_POLICIES:
+            return f"Error: fsync must be one of {', '.join(FSYNC_POLICIES)}"
+        if path.is_dir():
+            return f"Error: '{file_path}' is a directory"
+        _expire_uploads()
+        with _uploads_lock:
+            if len(_uploads) >= MAX_UPLOADS:
+                return f"Error: too many open uploads ({MAX_UPLOADS}), commit or abort one first"
         
         if create_dirs:
             path.parent.mkdir(parents=True, exist_ok=True)
+        upload = Upload(path, fsync)
+        upload_id = secrets.token_hex(8)
+        with _uploads_lock:
+            _uploads[upload_id] = upload
         
-        with open(path, 'w', encoding=encoding) as f:
-            f.write(content)
+        return json.dumps({"upload_id": upload_id, "path": str(path), "expires_after": UPLOAD_TTL}, indent=2)
+    except Exception as e:
+        return f"Error opening upload: {str(e)}"
+
+@mcp.tool()
+@concurrent_tool()
+def write_chunk(upload_id: str, content: str, offset: Optional[int] = None, encoding: str = "utf-8") -> str:
+    """
+    Write one chunk of an upload.
+    
+    Args:
+        upload_id: Id returned by open_upload
+        content: Chunk content
+        offset: Byte offset of the chunk (default: end of what was written so far).
+            Sending a chunk again at the same offset overwrites it, so a failed chunk can be retried
+        encoding: Text encoding of the content, or "base64" for binary data
+    
+    Returns:
+        JSON string with the bytes written and the current size of the upload
+    """
+    try:
+        upload = _take_upload(upload_id)
+        data = base64.b64decode(content, validate=True) if encoding == "base64" else content.encode(encoding)
+        with upload.lock:
+            if offset is None:
+                offset = upload.size
+            if offset < 0 or offset > upload.size:
+                return f"Error: offset must be between 0 and the current size ({upload.size})"
+            upload.file.seek(offset)
+            upload.file.write(data)
+            upload.size = max(upload.size, offset + len(data))
+            size = upload.size
         
-        return f"Successfully wrote {len(content)} characters to '{file_path}'"
+        return json.dumps({"upload_id": upload_id, "offset": offset, "written": len(data), "size": size}, indent=2)
     except Exception as e:
-        return f"Error writing file: {str(e)}"
+        return f"Error writing chunk: {str(e)}"
+
+@mcp.tool()
+@concurrent_tool()
+def commit_upload(upload_id: str, expected_size: Optional[int] = None) -> str:
+    """
+    Finish an upload, replacing the destination file in one step.
+    
+    Args:
+        upload_id: Id returned by open_upload
+        expected_size: If given, the commit fails (and the upload stays open) unless this many bytes were written
+    
+    Returns:
+        Success or error message
+    """
+    try:
+        upload = _take_upload(upload_id)
+        with upload.lock:
+            if expected_size is not None and expected_size != upload.size:
+                return f"Error: upload has {upload.size} bytes, expected {expected_size}"
+            with _uploads_lock:
+                _uploads.pop(upload_id, None)
+            try:
+                _sync(upload.file, upload.fsync)
+                upload.file.close()
+                _publish(upload.temp, upload.path, upload.fsync)
+            except BaseException:
+                upload.discard()
+                raise
+        
+        return f"Successfully wrote {upload.size} bytes to '{upload.path}'"
+    except Exception as e:
+        return f"Error committing upload: {str(e)}"
+
+@mcp.tool()
+@concurrent_tool()
+def abort_upload(upload_id: str) -> str:
+    """
+    Discard an upload, leaving the destination file untouched.
+    
+    Args:
+        upload_id: Id returned by open_upload
+    
+    Returns:
+        Success or error message
+    """
+    try:
+        upload = _take_upload(upload_id, remove=True)
+        with upload.lock:
+            upload.discard()
+        return f"Successfully aborted upload '{upload_id}'"
+    except Exception as e:
+        return f"Error aborting upload: {str(e)}"
 
 @mcp.tool()
+@concurrent_tool()
 def append_file(file_path: str, content: str, encoding: str = "utf-8") -> str:
     """
     Append content to a file.
@@ -119,53 +523,95 @@ def append_file(file_path: str, content: str, encoding: str = "utf-8") -> str:
     except Exception as e:
         return f"Error appending to file: {str(e)}"
 
+# Listings
+LIST_LIMIT = 1000  # entries per list_directory page
+LIST_SORT_KEYS = ("name", "size", "modified")
+
+def _is_dir(entry: os.DirEntry) -> bool:
+    try:
+        return entry.is_dir()
+    except OSError:
+        return False
+
+def _entry_info(entry: os.DirEntry) -> Dict[str, Any]:
+    # A single stat per entry (DirEntry caches it)
+    try:
+        st = entry.stat()
+    except OSError:
+        st = entry.stat(follow_symlinks=False)  # broken symlink
+    return {
+        "name": entry.name,
+        "type": "directory" if S_ISDIR(st.st_mode) else "file",
+        "size": st.st_size if S_ISREG(st.st_mode) else None,
+        "modified": st.st_mtime
+    }
+
+def _list_directory(directory_path: str, show_hidden: bool = False, offset: int = 0,
+                    limit: int = LIST_LIMIT, sort_by: str = "name", descending: bool = False) -> Dict[str, Any]:
+    path = safe_path(directory_path)
+    
+    if not path.exists():
+        raise ToolError(f"Directory '{directory_path}' does not exist")
+    
+    if not path.is_dir():
+        raise ToolError(f"'{directory_path}' is not a directory")
+    
+    if sort_by not in LIST_SORT_KEYS:
+        raise ToolError(f"sort_by must be one of {', '.join(LIST_SORT_KEYS)}")
+    if offset < 0 or limit < 1:
+        raise ToolError("offset must be >= 0 and limit >= 1")
+    
+    with os.scandir(path) as it:
+        entries = [e for e in it if show_hidden or not e.name.startswith('.')]
+    
+    if sort_by == "name":
+        # Sorting by name needs no stat: only the entries of the page are read
+        entries.sort(key=lambda e: e.name.lower(), reverse=descending)
+        entries.sort(key=lambda e: not _is_dir(e))
+        items = [_entry_info(e) for e in entries[offset:offset + limit]]
+    else:
+        items = [_entry_info(e) for e in entries]
+        items.sort(key=lambda x: x[sort_by] or 0, reverse=descending)
+        items.sort(key=lambda x: x["type"] != "directory")
+        items = items[offset:offset + limit]
+    
+    end = offset + len(items)
+    return {
+        "directory": str(path),
+        "items": items,
+        "total_items": len(entries),
+        "offset": offset,
+        "next_offset": end if end < len(entries) else None
+    }
+
 @mcp.tool()
-def list_directory(directory_path: str, show_hidden: bool = False) -> str:
+@concurrent_tool()
+def list_directory(directory_path: str, show_hidden: bool = False, offset: int = 0,
+                   limit: int = LIST_LIMIT, sort_by: str = "name", descending: bool = False) -> str:
     """
-    List contents of a directory.
+    List contents of a directory, one page at a time.
     
     Args:
         directory_path: Path to the directory to list
         show_hidden: Whether to show hidden files (starting with .)
+        offset: Number of entries to skip
+        limit: Maximum number of entries to return
+        sort_by: "name", "size" or "modified" (directories always come first)
+        descending: Reverse the order within directories and files
     
     Returns:
-        JSON string with directory contents
+        JSON string with directory contents; next_offset is null on the last page
     """
     try:
-        path = safe_path(directory_path)
-        
-        if not path.exists():
-            return f"Error: Directory '{directory_path}' does not exist"
-        
-        if not path.is_dir():
-            return f"Error: '{directory_path}' is not a directory"
-        
-        items = []
-        for item in path.iterdir():
-            if not show_hidden and item.name.startswith('.'):
-                continue
-            
-            item_info = {
-                "name": item.name,
-                "type": "directory" if item.is_dir() else "file",
-                "size": item.stat().st_size if item.is_file() else None,
-                "modified": item.stat().st_mtime
-            }
-            items.append(item_info)
-        
-        # Sort: directories first, then files, both alphabetically
-        items.sort(key=lambda x: (x["type"] != "directory", x["name"].lower()))
-        
-        return json.dumps({
-            "directory": str(path),
-            "items": items,
-            "total_items": len(items)
-        }, indent=2)
-        
+        listing = _list_directory(directory_path, show_hidden, offset, limit, sort_by, descending)
+        return json.dumps(listing, separators=(",", ":"))
+    except ToolError as e:
+        return f"Error: {e}"
     except Exception as e:
         return f"Error listing directory: {str(e)}"
 
 @mcp.tool()
+@concurrent_tool()
 def create_directory(directory_path: str, parents: bool = True) -> str:
     """
     Create a new directory.
@@ -189,7 +635,20 @@ def create_directory(directory_path: str, parents: bool = True) -> str:
     except Exception as e:
         return f"Error creating directory: {str(e)}"
 
+def _delete_file(file_path: str) -> str:
+    path = safe_path(file_path)
+    
+    if not path.exists():
+        raise ToolError(f"File '{file_path}' does not exist")
+    
+    if not path.is_file():
+        raise ToolError(f"'{file_path}' is not a file")
+    
+    path.unlink()
+    return f"Successfully deleted file '{file_path}'"
+
 @mcp.tool()
+@concurrent_tool()
 def delete_file(file_path: str) -> str:
     """
     Delete a file.
@@ -201,21 +660,14 @@ def delete_file(file_path: str) -> str:
         Success or error message
     """
     try:
-        path = safe_path(file_path)
-        
-        if not path.exists():
-            return f"Error: File '{file_path}' does not exist"
-        
-        if not path.is_file():
-            return f"Error: '{file_path}' is not a file"
-        
-        path.unlink()
-        return f"Successfully deleted file '{file_path}'"
-        
+        return _delete_file(file_path)
+    except ToolError as e:
+        return f"Error: {e}"
     except Exception as e:
         return f"Error deleting file: {str(e)}"
 
 @mcp.tool()
+@concurrent_tool()
 def delete_directory(directory_path: str, recursive: bool = False) -> str:
     """
     Delete a directory.
@@ -247,7 +699,32 @@ def delete_directory(directory_path: str, recursive: bool = False) -> str:
     except Exception as e:
         return f"Error deleting directory: {str(e)}"
 
+def _file_info(file_path: str) -> Dict[str, Any]:
+    path = safe_path(file_path)
+    
+    if not path.exists():
+        raise ToolError(f"Path '{file_path}' does not exist")
+    
+    stat = path.stat()
+    info = {
+        "path": str(path),
+        "name": path.name,
+        "type": "directory" if path.is_dir() else "file",
+        "size": stat.st_size,
+        "created": stat.st_ctime,
+        "modified": stat.st_mtime,
+        "accessed": stat.st_atime,
+        "permissions": oct(stat.st_mode)[-3:],
+        "is_hidden": path.name.startswith('.'),
+    }
+    
+    if path.is_file():
+        info["extension"] = path.suffix
+    
+    return info
+
 @mcp.tool()
+@concurrent_tool()
 def file_info(file_path: str) -> str:
     """
     Get detailed information about a file or directory.
@@ -259,34 +736,132 @@ def file_info(file_path: str) -> str:
         JSON string with file information
     """
     try:
-        path = safe_path(file_path)
-        
-        if not path.exists():
-            return f"Error: Path '{file_path}' does not exist"
-        
-        stat = path.stat()
-        info = {
-            "path": str(path),
-            "name": path.name,
-            "type": "directory" if path.is_dir() else "file",
-            "size": stat.st_size,
-            "created": stat.st_ctime,
-            "modified": stat.st_mtime,
-            "accessed": stat.st_atime,
-            "permissions": oct(stat.st_mode)[-3:],
-            "is_hidden": path.name.startswith('.'),
-        }
-        
-        if path.is_file():
-            info["extension"] = path.suffix
-        
-        return json.dumps(info, indent=2)
-        
+        return json.dumps(_file_info(file_path), indent=2)
+    except ToolError as e:
+        return f"Error: {e}"
     except Exception as e:
         return f"Error getting file info: {str(e)}"
 
+# Search
+DEFAULT_EXCLUDES = [".git", "__pycache__", "node_modules"]
+MAX_SEARCH_RESULTS = 1000
+NAME_INDEX_ROOTS = 8  # search roots whose name index is kept
+
+def _glob_regex(pattern: str) -> str:
+    """Regex for a glob over relative paths: ** crosses directories, * and ? do not"""
+    out, i = [], 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+            continue
+        c = pattern[i]
+        end = pattern.find("]", i + 2) if c == "[" else -1
+        if c == "*":
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif end > 0:
+            body = pattern[i + 1:end]
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            out.append("[" + body.replace("\\", "\\\\") + "]")
+            i = end
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+class IgnoreRules:
+    """
+    .gitignore style excludes. "name" and "*.ext" match at any depth, patterns
+    with a slash are relative to the search root and a trailing slash only
+    matches directories. Excluded directories are not descended into.
+    """
+    def __init__(self, patterns: List[str]):
+        self.rules = []
+        for pattern in patterns:
+            pattern = pattern.strip()
+            if not pattern or pattern.startswith("#"):
+                continue
+            dir_only = pattern.endswith("/")
+            pattern = pattern.rstrip("/")
+            anchored = "/" in pattern
+            self.rules.append((re.compile(_glob_regex(pattern.lstrip("/"))), anchored, dir_only))
+
+    def excluded(self, rel: str, name: str, is_dir: bool) -> bool:
+        for regex, anchored, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.fullmatch(rel if anchored else name):
+                return True
+        return False
+
+def _scan(directory: str) -> List[os.DirEntry]:
+    try:
+        with os.scandir(directory) as it:
+            return sorted(it, key=lambda e: e.name)
+    except OSError:
+        return []  # no permission, or deleted during the walk
+
+class NameIndex:
+    """
+    Directory listings of one search root, kept between searches. A directory
+    is listed again only when its mtime changed, so a repeated search costs one
+    stat per directory instead of a full walk.
+    """
+    def __init__(self):
+        self.dirs: Dict[str, tuple] = {}
+
+    def listdir(self, directory: str) -> List[os.DirEntry]:
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            return []
+        cached = self.dirs.get(directory)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        entries = _scan(directory)
+        self.dirs[directory] = (mtime, entries)
+        return entries
+
+_name_indexes: "OrderedDict[str, NameIndex]" = OrderedDict()
+_name_indexes_lock = threading.Lock()
+
+def _name_index(root: str) -> NameIndex:
+    with _name_indexes_lock:
+        index = _name_indexes.pop(root, None) or NameIndex()
+        _name_indexes[root] = index
+        while len(_name_indexes) > NAME_INDEX_ROOTS:
+            _name_indexes.popitem(last=False)
+        return index
+
+def _walk(root: str, regex, ignore: IgnoreRules, recursive: bool, listdir):
+    """Yields (relative path, DirEntry) of every match, depth first in name order"""
+    stack = [("", root)]
+    while stack:
+        rel_dir, directory = stack.pop()
+        subdirs = []
+        for entry in listdir(directory):
+            rel = rel_dir + entry.name
+            is_dir = entry.is_dir(follow_symlinks=False)
+            if ignore.excluded(rel, entry.name, is_dir):
+                continue
+            if regex.fullmatch(rel):
+                yield rel, entry
+            if is_dir and recursive:
+                subdirs.append((rel + "/", entry.path))
+        stack.extend(reversed(subdirs))
+
 @mcp.tool()
-def search_files(directory_path: str, pattern: str, recursive: bool = True) -> str:
+@concurrent_tool(SEARCH_CALLS)
+def search_files(directory_path: str, pattern: str, recursive: bool = True,
+                 exclude: Optional[List[str]] = None, max_results: int = MAX_SEARCH_RESULTS,
+                 use_index: bool = False) -> str:
     """
     Search for files matching a pattern in a directory.
     
@@ -294,6 +869,10 @@ def search_files(directory_path: str, pattern: str, recursive: bool = True) -> s
         directory_path: Directory to search in
         pattern: Glob pattern to match (e.g., "*.txt", "**/*.py")
         recursive: Whether to search recursively in subdirectories
+        exclude: .gitignore style patterns to skip (default: .git, __pycache__, node_modules)
+        max_results: Stop after this many matches
+        use_index: Keep the directory listings in memory so later searches under
+            the same directory only re-read directories that changed
     
     Returns:
         JSON string with matching files
@@ -310,30 +889,249 @@ def search_files(directory_path: str, pattern: str, recursive: bool = True) -> s
         if recursive and not pattern.startswith("**/"):
             pattern = f"**/{pattern}"
         
-        matches = list(path.glob(pattern))
+        regex = re.compile(_glob_regex(pattern))
+        ignore = IgnoreRules(DEFAULT_EXCLUDES if exclude is None else exclude)
+        listdir = _name_index(str(path)).listdir if use_index else _scan
+        # Without ** or / in the pattern there is no need to go into subdirectories
+        descend = recursive or "/" in pattern or "**" in pattern
         
-        # Filter to only allowed paths
         allowed_matches = []
-        for match in matches:
-            if is_path_allowed(str(match)):
-                allowed_matches.append({
-                    "path": str(match),
-                    "name": match.name,
-                    "type": "directory" if match.is_dir() else "file",
-                    "size": match.stat().st_size if match.is_file() else None
-                })
+        truncated = False
+        for rel, entry in _walk(str(path), regex, ignore, descend, listdir):
+            if len(allowed_matches) >= max_results:
+                truncated = True
+                break
+            if entry.is_symlink():
+                # A symlink can point outside the allowed directories
+                if not is_path_allowed(entry.path):
+                    continue
+                is_dir = os.path.isdir(entry.path)
+            else:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            try:
+                # The DirEntry in the index can be old, so the size is read again
+                size = None if is_dir else (os.stat(entry.path) if use_index else entry.stat()).st_size
+            except OSError:
+                continue
+            allowed_matches.append({
+                "path": entry.path,
+                "name": entry.name,
+                "type": "directory" if is_dir else "file",
+                "size": size
+            })
         
         return json.dumps({
             "search_directory": str(path),
             "pattern": pattern,
             "matches": allowed_matches,
-            "total_matches": len(allowed_matches)
+            "total_matches": len(allowed_matches),
+            "truncated": truncated
         }, indent=2)
         
     except Exception as e:
         return f"Error searching files: {str(e)}"
 
+# Content search
+GREP_WORKERS = min(4, os.cpu_count() or 1)
+GREP_BATCH_FILES = 64  # files handed to a worker process at a time
+GREP_INLINE_FILES = 16  # fewer files than this are scanned without the pool
+GREP_MAX_BYTES = 64 * 1024
+GREP_MAX_MATCHES = 500
+GREP_LINE_CHARS = 400  # longer lines (minified files...) are cut
+BINARY_SNIFF = 8192
+GREP_BLOCK = 1024 * 1024  # bytes of a file decoded and searched at a time
+
+_grep_pool = None
+_grep_pool_lock = threading.Lock()
+
+def _grep_executor() -> ProcessPoolExecutor:
+    global _grep_pool
+    with _grep_pool_lock:
+        if _grep_pool is None:
+            # spawn: the server has threads, fork is not safe
+            _grep_pool = ProcessPoolExecutor(GREP_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _grep_pool
+
+def _line_text(mm: mmap.mmap, start: int, end: int) -> str:
+    return mm[start:min(end, start + GREP_LINE_CHARS * 4)].decode("utf-8", errors="replace")[:GREP_LINE_CHARS].rstrip("\r")
+
+def _grep_file(path: str, regex, context: int, max_matches: int) -> List[Dict[str, Any]]:
+    matches = []
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return matches
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if b"\0" in mm[:BINARY_SNIFF]:
+                return matches  # binary
+            line, block = 1, 0
+            while block < len(mm) and len(matches) < max_matches:
+                # Blocks end after a newline, so no line or character is split
+                block_end = mm.find(b"\n", block + GREP_BLOCK)
+                block_end = len(mm) if block_end < 0 else block_end + 1
+                # surrogateescape keeps invalid bytes, so byte offsets stay exact
+                text = mm[block:block_end].decode("utf-8", errors="surrogateescape")
+                line = _grep_block(mm, block, text, path, line, regex, context, max_matches, matches)
+                block = block_end
+    return matches
+
+def _grep_block(mm: mmap.mmap, offset: int, text: str, path: str, line: int, regex,
+                context: int, max_matches: int, matches: List[Dict[str, Any]]) -> int:
+    """
+    Adds the lines of `text` (the block of `mm` starting at byte `offset`) that match
+    to `matches`. Returns the number of the line that follows the block.
+    """
+    # After the block's final newline the next line belongs to the next block (^ and $ still match there)
+    last = len(text) - 1 if text.endswith("\n") else len(text)
+    counted, pos = 0, 0
+    while len(matches) < max_matches and pos <= len(text):
+        m = regex.search(text, pos)
+        if m is None or m.start() > last:
+            break
+        start = text.rfind("\n", 0, m.start()) + 1
+        end = text.find("\n", m.start())
+        end = len(text) if end < 0 else end
+        pos = end + 1  # one match per line
+        if m.end() > end and not regex.search(text, start, end):
+            # The match crossed into another line (\s, [^x]...): like grep, lines are matched one by one
+            continue
+        line += text.count("\n", counted, start)
+        offset += len(text[counted:start].encode("utf-8", errors="surrogateescape"))
+        counted = start
+        b_start = offset
+        b_end = offset + len(text[start:end].encode("utf-8", errors="surrogateescape"))
+        match = {"path": path, "line": line, "text": _line_text(mm, b_start, b_end)}
+        if context:
+            match["before"], match["after"] = _context_lines(mm, b_start, b_end, context)
+        matches.append(match)
+    return line + text.count("\n", counted)
+
+def _context_lines(mm: mmap.mmap, start: int, end: int, context: int) -> tuple:
+    before, b_end = [], start - 1
+    while len(before) < context and b_end >= 0:
+        b_start = mm.rfind(b"\n", 0, b_end) + 1
+        before.append(_line_text(mm, b_start, b_end))
+        b_end = b_start - 1
+    after, a_start = [], end + 1
+    while len(after) < context and a_start < len(mm):
+        a_end = mm.find(b"\n", a_start)
+        a_end = len(mm) if a_end < 0 else a_end
+        after.append(_line_text(mm, a_start, a_end))
+        a_start = a_end + 1
+    return before[::-1], after
+
+def _grep_batch(paths: List[str], pattern: str, flags: int, context: int,
+                max_matches: int, max_bytes: int) -> tuple:
+    """
+    Runs in a worker process. Returns (matches, files scanned), stopping once
+    the batch alone fills max_matches or max_bytes.
+    """
+    regex = re.compile(pattern, flags)
+    out, used, scanned = [], 0, 0
+    for path in paths:
+        try:
+            found = _grep_file(path, regex, context, max_matches - len(out))
+        except (OSError, ValueError):
+            continue  # unreadable, or changed while it was read
+        scanned += 1
+        out.extend(found)
+        used += sum(len(json.dumps(m)) for m in found)
+        if len(out) >= max_matches or used >= max_bytes:
+            break
+    return out, scanned
+
+@mcp.tool()
+@concurrent_tool(SEARCH_CALLS)
+def grep_files(directory_path: str, pattern: str, file_pattern: str = "*",
+               recursive: bool = True, exclude: Optional[List[str]] = None,
+               ignore_case: bool = False, context: int = 0,
+               max_matches: int = GREP_MAX_MATCHES, max_bytes: int = GREP_MAX_BYTES) -> str:
+    """
+    Search the contents of files for a regular expression, returning only the matching lines.
+    
+    Args:
+        directory_path: Directory to search in
+        pattern: Regular expression (Python syntax) matched line by line
+        file_pattern: Glob of the files to scan (e.g., "*.py")
+        recursive: Whether to search recursively in subdirectories
+        exclude: .gitignore style patterns to skip (default: .git, __pycache__, node_modules)
+        ignore_case: Case insensitive matching
+        context: Lines to include before and after each match
+        max_matches: Stop after this many matching lines
+        max_bytes: Stop once the matches add up to about this many bytes
+    
+    Files are read as UTF-8; binary files are skipped.
+    
+    Returns:
+        JSON string with matching lines
+    """
+    try:
+        path = safe_path(directory_path)
+        
+        if not path.exists():
+            return f"Error: Directory '{directory_path}' does not exist"
+        
+        if not path.is_dir():
+            return f"Error: '{directory_path}' is not a directory"
+        
+        flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+        try:
+            re.compile(pattern, flags)
+        except re.error as e:
+            return f"Error: invalid pattern: {e}"
+        
+        if recursive and not file_pattern.startswith("**/"):
+            file_pattern = f"**/{file_pattern}"
+        regex = re.compile(_glob_regex(file_pattern))
+        ignore = IgnoreRules(DEFAULT_EXCLUDES if exclude is None else exclude)
+        files = []
+        for _, entry in _walk(str(path), regex, ignore, recursive or "/" in file_pattern, _scan):
+            if entry.is_symlink():
+                if is_path_allowed(entry.path) and os.path.isfile(entry.path):
+                    files.append(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                files.append(entry.path)
+        
+        args = (pattern, flags, max(0, context), max_matches, max_bytes)
+        if len(files) < GREP_INLINE_FILES:
+            batches = [_grep_batch(files, *args)]
+        else:
+            # One batch per process; results are used in order and the rest is cancelled
+            executor = _grep_executor()
+            futures = [executor.submit(_grep_batch, files[i:i + GREP_BATCH_FILES], *args)
+                       for i in range(0, len(files), GREP_BATCH_FILES)]
+            batches = (future.result() for future in futures)
+        
+        matches, used, scanned, truncated = [], 0, 0, False
+        for found, batch_scanned in batches:
+            scanned += batch_scanned
+            for match in found:
+                size = len(json.dumps(match))
+                if len(matches) >= max_matches or (matches and used + size > max_bytes):
+                    truncated = True
+                    break
+                matches.append(match)
+                used += size
+            if truncated or len(matches) >= max_matches:
+                truncated = True
+                break
+        if len(files) >= GREP_INLINE_FILES:
+            for future in futures:
+                future.cancel()
+        
+        return json.dumps({
+            "search_directory": str(path),
+            "pattern": pattern,
+            "matches": matches,
+            "total_matches": len(matches),
+            "files_scanned": scanned,
+            "truncated": truncated
+        }, indent=2)
+        
+    except Exception as e:
+        return f"Error searching file contents: {str(e)}"
+
 @mcp.tool()
+@concurrent_tool()
 def get_allowed_directories() -> str:
     """
     Get list of allowed root directories for file operations.
@@ -363,6 +1161,65 @@ def get_allowed_directories() -> str:
         "note": "File operations are restricted to these directories and their subdirectories"
     }, indent=2)
 
+# Batch
+# op -> (tool, helper that raises on failure)
+BATCH_OPS = {
+    "read": (read_file, _read_file),
+    "stat": (file_info, _file_info),
+    "list": (list_directory, _list_directory),
+    "write": (write_file, _write_file),
+    "delete": (delete_file, _delete_file),
+}
+MAX_BATCH_OPS = 100
+
+async def _run_op(index: int, operation: Dict[str, Any]) -> Dict[str, Any]:
+    args = dict(operation)
+    op = args.pop("op", None)
+    result = {"index": index, "op": op}
+    if op not in BATCH_OPS:
+        return {**result, "ok": False, "error": f"op must be one of {', '.join(BATCH_OPS)}"}
+    tool, helper = BATCH_OPS[op]
+    try:
+        # Same pool and same limit as the tool on its own
+        output = await _run_limited(tool.__name__, WORKER_THREADS, helper, **args)
+    except ToolError as e:
+        return {**result, "ok": False, "error": str(e)}
+    except Exception as e:
+        # Arguments the tool does not take, disk errors, etc.
+        return {**result, "ok": False, "error": f"{type(e).__name__}: {e}"}
+    return {**result, "ok": True, "result": output}
+
+@mcp.tool()
+async def batch(operations: List[Dict[str, Any]], sequential: bool = False) -> str:
+    """
+    Run several file operations in one call. Each operation is an object with
+    "op" and the arguments of the matching tool:
+        read   -> read_file    (file_path, offset, length, start_line, end_line, head, tail...)
+        stat   -> file_info    (file_path)
+        list   -> list_directory (directory_path, offset, limit, sort_by...)
+        write  -> write_file   (file_path, content...)
+        delete -> delete_file  (file_path)
+    e.g. [{"op": "stat", "file_path": "a.txt"}, {"op": "read", "file_path": "b.txt", "head": 20}]
+    
+    Args:
+        operations: Operations to run, at most 100
+        sequential: Run them one after another, in order (default: all at once)
+    
+    Returns:
+        JSON string with one result per operation, in the same order, each with
+        ok and either result or error
+    """
+    if len(operations) > MAX_BATCH_OPS:
+        return f"Error: a batch can have at most {MAX_BATCH_OPS} operations"
+    if sequential:
+        results = [await _run_op(i, operation) for i, operation in enumerate(operations)]
+    else:
+        results = await asyncio.gather(*(_run_op(i, operation) for i, operation in enumerate(operations)))
+    return json.dumps({
+        "results": results,
+        "failed": sum(not r["ok"] for r in results)
+    }, separators=(",", ":"))
+
 # Resource for current working directory
 @mcp.resource("file://cwd")
 def current_working_directory() -> str:
@@ -0,0 +1,55 @@
+"""
+Calls per second of the read tools of git_server, before (a new Repo and a git
+process per call, as the server used to do) and after (cached Repo with its
+cat-file worker). The memo is bypassed so every call really reads the repo.
+
+    python benchmark.py [repo_path] [calls]
+"""
+import sys
+import time
+from git import Repo
+
+import git_server
+
+def _rate(fn, calls: int) -> float:
+    fn()  # calentamiento
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return calls / (time.perf_counter() - start)
+
+def _log_before(path: str, max_count: int):
+    repo = Repo(path)
+    try:
+        return [{
+            "hash": c.hexsha[:10],
+            "author": f"{c.author.name} <{c.author.email}>",
+            "date": c.committed_datetime.isoformat(),
+            "message": c.message.strip(),
+        } for c in repo.iter_commits(max_count=max_count)]
+    finally:
+        repo.close()
+
+def _ls_files_before(path: str):
+    repo = Repo(path)
+    try:
+        return repo.git.ls_files().splitlines()
+    finally:
+        repo.close()
+
+def main(path: str, calls: int):
+    entry = git_server._cached_repo(path)
+    cases = {
+        "git_log(10)": (lambda: _log_before(path, 10), lambda: git_server._read_log(entry, 10)),
+        "git_log(100)": (lambda: _log_before(path, 100), lambda: git_server._read_log(entry, 100)),
+        "git_ls_files": (lambda: _ls_files_before(path), lambda: git_server._read_ls_files(entry.repo)),
+    }
+    print(f"{'tool':<14}{'before':>12}{'after':>12}   calls/s ({calls} calls)")
+    for name, (before, after) in cases.items():
+        b, a = _rate(before, calls), _rate(after, calls)
+        print(f"{name:<14}{b:>12.1f}{a:>12.1f}   x{a / b:.1f}")
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else "."
+    calls = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    main(path, calls)
@@ -1,11 +1,23 @@
 # git_server.py
 import os
+import re
+import json
+import atexit
+import asyncio
+import inspect
+import signal
 import logging
+import functools
+import threading
+import subprocess
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from mcp.server.fastmcp import FastMCP
-from git import Repo, InvalidGitRepositoryError, NoSuchPathError, GitCommandError, Actor
+from git import Git, Repo, InvalidGitRepositoryError, NoSuchPathError, GitCommandError, Actor
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(format="[%(levelname)s]: %(message)s", level=logging.INFO)
@@ -16,14 +28,231 @@ def _abs(p: str) -> Path:
     # Resuelve rutas relativas al CWD del proceso (tu host puede cambiar CWD con filesystem_server)
     return Path(p).expanduser().resolve()
 
-def _open_repo(repo_path: str) -> Repo:
-    path = _abs(repo_path)
-    if not path.exists():
-        raise FileNotFoundError(f"Path does not exist: {path}")
+# --- Repo cache ------------------------------------------------------------
+REPO_CACHE_SIZE = 8  # repos abiertos que se mantienen entre llamadas
+
+def _stat_key(path: Path):
+    try:
+        st = path.stat()
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+def _repo_state(repo: Repo) -> tuple:
+    """
+    Changes whenever HEAD, the index or the refs change. Ref updates are written
+    with a rename, which also bumps the mtime of the directory holding them.
+    """
+    git_dir, common_dir = Path(repo.git_dir), Path(repo.common_dir)
+    head = git_dir / "HEAD"
+    state = [
+        _stat_key(head),
+        _stat_key(git_dir / "index"),
+        _stat_key(common_dir / "packed-refs"),
+        _stat_key(common_dir / "refs" / "heads"),
+    ]
     try:
-        return Repo(path)
-    except InvalidGitRepositoryError:
-        raise RuntimeError(f"Not a git repository: {path}")
+        target = head.read_text(encoding="utf-8").strip()
+    except OSError:
+        target = ""
+    if target.startswith("ref: "):
+        state.append(_stat_key(common_dir / target[5:]))
+    return tuple(state)
+
+# --- Object reader ---------------------------------------------------------
+PIPELINE_DEPTH = 64  # pedidos escritos a cat-file antes de leer las respuestas
+
+class _CatFile:
+    """
+    Long lived `git cat-file --batch` of one repository. Names are written up
+    to PIPELINE_DEPTH at a time before reading the answers back, so reading many
+    objects costs neither a fork nor a round trip per object.
+    """
+    def __init__(self, git_dir: str):
+        self.git_dir = git_dir
+        self.proc = None
+        self.lock = threading.Lock()
+
+    def _process(self):
+        if self.proc is None or self.proc.poll() is not None:
+            self.proc = subprocess.Popen(
+                [Git.GIT_PYTHON_GIT_EXECUTABLE or "git", "--git-dir", self.git_dir, "cat-file", "--batch"],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            )
+        return self.proc
+
+    def read(self, names: List[str]) -> List[Optional[tuple]]:
+        """
+        (hexsha, type, data) for every name (sha or revision), None when missing
+        """
+        out = []
+        with self.lock:
+            proc = self._process()
+            try:
+                for i in range(0, len(names), PIPELINE_DEPTH):
+                    window = names[i:i + PIPELINE_DEPTH]
+                    proc.stdin.write(b"".join(n.encode() + b"\n" for n in window))
+                    proc.stdin.flush()
+                    for _ in window:
+                        header = proc.stdout.readline()
+                        if not header:
+                            raise RuntimeError("git cat-file exited")
+                        if header.endswith(b" missing\n") or header.endswith(b" ambiguous\n"):
+                            out.append(None)
+                            continue
+                        sha, kind, size = header.split()
+                        data = proc.stdout.read(int(size))
+                        proc.stdout.read(1)  # salto de línea final
+                        out.append((sha.decode(), kind.decode(), data))
+            except Exception:
+                # Respuestas a medio leer: el proceso ya no sirve
+                self._kill()
+                raise
+        return out
+
+    def _kill(self):
+        if self.proc is not None:
+            self.proc.kill()
+            self.proc.wait()
+            self.proc = None
+
+    def close(self):
+        with self.lock:
+            if self.proc is not None and self.proc.poll() is None:
+                self.proc.stdin.close()
+                try:
+                    self.proc.wait(timeout=2)
+                except subprocess.TimeoutExpired:
+                    pass
+            self._kill()
+
+def _parse_commit(sha: str, data: bytes) -> Dict[str, Any]:
+    headers, _, message = data.partition(b"\n\n")
+    commit = {"sha": sha, "parents": [], "encoding": "utf-8"}
+    for line in headers.split(b"\n"):
+        if line.startswith(b" "):
+            continue  # continuación de gpgsig / mergetag
+        key, _, value = line.partition(b" ")
+        if key == b"parent":
+            commit["parents"].append(value.decode())
+        elif key in (b"author", b"committer"):
+            ident, ts, tz = value.rsplit(b" ", 2)
+            commit[key.decode()] = (ident, int(ts), tz.decode())
+        elif key == b"encoding":
+            commit["encoding"] = value.decode()
+    try:
+        commit["message"] = message.decode(commit["encoding"], errors="replace")
+    except LookupError:
+        commit["message"] = message.decode("utf-8", errors="replace")
+    return commit
+
+def _iso_date(ts: int, tz: str) -> str:
+    sign = -1 if tz.startswith("-") else 1
+    offset = timedelta(hours=int(tz[1:3]), minutes=int(tz[3:5])) * sign
+    return datetime.fromtimestamp(ts, timezone(offset)).isoformat()
+
+class _CommitWalk:
+    """
+    The first `limit` commits reachable from `starts` in rev-list --date-order:
+    newest committer date first, but never before all of its children. The commits
+    given are then closed under descendants and `frontier()` (the starts and parents
+    not given yet) resumes the walk exactly where it stopped. git does the ordering
+    (incrementally when the repo has a commit-graph); the commits are read in one
+    pipelined batch.
+    """
+    def __init__(self, repo: Repo, cat: _CatFile, starts: List[str], limit: int):
+        try:
+            shas = repo.git.rev_list("--date-order", f"--max-count={limit}", *starts, "--").split()
+        except GitCommandError:
+            shas = []  # repo sin commits o cursor con commits que ya no existen
+        objs = cat.read(list(starts) + shas) if shas else []
+        # Los starts se resuelven con el mismo cat-file (HEAD -> sha)
+        self.starts = [obj[0] for obj in objs[:len(starts)] if obj is not None]
+        self.commits = [_parse_commit(obj[0], obj[2]) for obj in objs[len(starts):]
+                        if obj is not None and obj[1] == "commit"]
+        self.given = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> Dict[str, Any]:
+        if self.given >= len(self.commits):
+            raise StopIteration
+        self.given += 1
+        return self.commits[self.given - 1]
+
+    def push_back(self, commit: Dict[str, Any]):
+        """
+        Returns the commit just taken, it stays in the frontier
+        """
+        self.given -= 1
+
+    def frontier(self) -> List[str]:
+        given = self.commits[:self.given]
+        done = {c["sha"] for c in given}
+        out = self.starts + [p for c in given for p in c["parents"]]
+        return [sha for sha in dict.fromkeys(out) if sha not in done]
+
+class _CachedRepo:
+    """
+    A Repo kept open between tool calls, with its own cat-file worker. Values
+    derived from it are memoized until HEAD, the index or the refs change.
+    """
+    def __init__(self, repo: Repo):
+        self.repo = repo
+        self.cat_file = _CatFile(repo.git_dir)
+        self.state = None
+        self.memo: Dict[Any, Any] = {}
+
+    def close(self):
+        self.cat_file.close()
+        self.repo.close()  # termina los procesos git persistentes del repo
+
+    def memoized(self, key, compute):
+        state = _repo_state(self.repo)
+        if state != self.state:
+            self.memo.clear()
+            self.state = state
+        if key not in self.memo:
+            self.memo[key] = compute()
+        return self.memo[key]
+
+_repo_cache: "OrderedDict[Path, _CachedRepo]" = OrderedDict()
+_repo_cache_lock = threading.RLock()  # las herramientas corren en varios hilos
+
+def _cached_repo(repo_path: str) -> _CachedRepo:
+    path = _abs(repo_path)
+    with _repo_cache_lock:
+        entry = _repo_cache.get(path)
+        if entry is not None:
+            if path.exists():
+                _repo_cache.move_to_end(path)
+                return entry
+            _evict(path)
+        if not path.exists():
+            raise FileNotFoundError(f"Path does not exist: {path}")
+        try:
+            entry = _CachedRepo(Repo(path))
+        except InvalidGitRepositoryError:
+            raise RuntimeError(f"Not a git repository: {path}")
+        _repo_cache[path] = entry
+        while len(_repo_cache) > REPO_CACHE_SIZE:
+            _evict(next(iter(_repo_cache)))
+        return entry
+
+def _evict(path: Path):
+    with _repo_cache_lock:
+        entry = _repo_cache.pop(path, None)
+    if entry is not None:
+        entry.close()
+
+@atexit.register
+def _close_repos():
+    for path in list(_repo_cache):
+        _evict(path)
+
+def _open_repo(repo_path: str) -> Repo:
+    return _cached_repo(repo_path).repo
 
 def _branch_name(repo: Repo) -> Optional[str]:
     try:
@@ -31,8 +260,87 @@ def _branch_name(repo: Repo) -> Optional[str]:
     except Exception:
         return None  # detached HEAD o repo recién inicializado
 
+def _current_branch(repo_path: str) -> Optional[str]:
+    entry = _cached_repo(repo_path)
+    return entry.memoized("branch", lambda: _branch_name(entry.repo))
+
+# --- Blocking work ---------------------------------------------------------
+WORKER_THREADS = 8  # hilos para las herramientas bloqueantes
+
+_executor = ThreadPoolExecutor(max_workers=WORKER_THREADS, thread_name_prefix="git-tool")
+_tool_limits: Dict[str, asyncio.Semaphore] = {}
+_repo_locks: Dict[Path, threading.RLock] = {}
+_repo_locks_guard = threading.Lock()
+
+def _repo_lock(path: str) -> threading.RLock:
+    # GitPython no es thread safe: una llamada a la vez por repo
+    key = _abs(path)
+    with _repo_locks_guard:
+        return _repo_locks.setdefault(key, threading.RLock())
+
+async def _in_pool(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+def concurrent_tool(limit: int = WORKER_THREADS):
+    """
+    Keeps the server answering while a tool runs: plain functions run on the
+    worker pool (one at a time per repository), coroutines run as they are.
+    At most `limit` calls of the same tool run at once.
+    """
+    def wrap(fn):
+        signature = inspect.signature(fn)
+
+        def serialized(*args, **kwargs):
+            path = signature.bind(*args, **kwargs).arguments.get("path")
+            if path is None:
+                return fn(*args, **kwargs)
+            with _repo_lock(path):
+                return fn(*args, **kwargs)
+
+        @functools.wraps(fn)
+        async def tool(*args, **kwargs):
+            limit_sem = _tool_limits.setdefault(fn.__name__, asyncio.Semaphore(limit))
+            async with limit_sem:
+                if inspect.iscoroutinefunction(fn):
+                    return await fn(*args, **kwargs)
+                return await _in_pool(serialized, *args, **kwargs)
+        return tool
+    return wrap
+
+async def _run_git(args: List[str], cwd: Optional[Path] = None) -> str:
+    """
+    Runs a long git command (clone, pull, push) as an asyncio subprocess that is
+    killed if the call is cancelled. Raises GitCommandError when it fails.
+    """
+    command = [Git.GIT_PYTHON_GIT_EXECUTABLE or "git", *args]
+    proc = await asyncio.create_subprocess_exec(
+        *command, cwd=cwd,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        env={**os.environ, "GIT_TERMINAL_PROMPT": "0"},  # sin credenciales falla en vez de colgarse
+        start_new_session=os.name != "nt",
+    )
+    try:
+        out, err = await proc.communicate()
+    except asyncio.CancelledError:
+        # git lanza helpers (remote-https, index-pack...), se mata el grupo entero
+        if os.name != "nt":
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        else:
+            proc.kill()
+        raise
+    if proc.returncode != 0:
+        raise GitCommandError(command, proc.returncode, err.decode(errors="replace"), out.decode(errors="replace"))
+    return out.decode(errors="replace").strip()
+
 # Herramientas que resuelven
 @mcp.tool()
+@concurrent_tool()
 def git_init(path: str, bare: bool = False) -> Dict[str, Any]:
     """
     Initialize a new git repository at `path`.
@@ -44,30 +352,81 @@ def git_init(path: str, bare: bool = False) -> Dict[str, Any]:
     logger.info(f"Initialized repo at {p} (bare={bare})")
     return {"path": str(p), "bare": bare, "created": True}
 
+STATUS_UNTRACKED = ("no", "normal", "all")
+
+def _porcelain_records(cwd: str, args: List[str]):
+    """
+    NUL separated records of a git command, parsed while git is still writing them
+    """
+    command = [Git.GIT_PYTHON_GIT_EXECUTABLE or "git", *args]
+    proc = subprocess.Popen(command, cwd=cwd, stdin=subprocess.DEVNULL,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        rest = b""
+        while chunk := proc.stdout.read1(64 * 1024):
+            records = (rest + chunk).split(b"\0")
+            rest = records.pop()
+            for record in records:
+                yield record.decode("utf-8", errors="replace")
+        err = proc.stderr.read()
+        if proc.wait() != 0:
+            raise GitCommandError(command, proc.returncode, err.decode(errors="replace"))
+    finally:
+        if proc.poll() is None:
+            proc.kill()  # el consumidor cortó antes de tiempo
+        proc.wait()
+        proc.stdout.close()
+        proc.stderr.close()
+
 @mcp.tool()
-def git_status(path: str) -> Dict[str, Any]:
+@concurrent_tool()
+def git_status(path: str, untracked: str = "all") -> Dict[str, Any]:
     """
-    Show working tree status.
-    Returns: { branch, staged, unstaged, untracked }
+    Show working tree status, from one `git status --porcelain=v2` pass.
+    untracked: "no" (skip untracked files), "normal" (untracked directories
+    collapsed, can use git's untracked cache) or "all" (every untracked file).
+    Returns: { branch, staged, unstaged, untracked, conflicted } plus
+    { upstream, ahead, behind } when the branch tracks one
     """
+    if untracked not in STATUS_UNTRACKED:
+        return {"error": f"untracked must be one of {', '.join(STATUS_UNTRACKED)}"}
     repo = _open_repo(path)
-    # staged vs unstaged
+    result = {"branch": None, "staged": [], "unstaged": [], "untracked": [], "conflicted": []}
+    records = _porcelain_records(repo.working_tree_dir, [
+        "status", "--porcelain=v2", "-z", "--branch", f"--untracked-files={untracked}",
+    ])
     try:
-        head = repo.head.commit
-        staged = [d.b_path for d in repo.index.diff(head)]
-    except Exception:
-        # Sin commits aún: todo lo agregado en index se considera staged
-        staged = [d.b_path for d in repo.index.diff(None)]
-    unstaged = [d.a_path for d in repo.index.diff(None)]  # cambios en WT no indexados
-    untracked = list(repo.untracked_files)
-    return {
-        "branch": _branch_name(repo),
-        "staged": staged,
-        "unstaged": unstaged,
-        "untracked": untracked,
-    }
+        for record in records:
+            kind = record[:1]
+            if kind == "#":
+                key, _, value = record[2:].partition(" ")
+                if key == "branch.head" and value != "(detached)":
+                    result["branch"] = value
+                elif key == "branch.upstream":
+                    result["upstream"] = value
+                elif key == "branch.ab":
+                    ahead, behind = value.split()
+                    result["ahead"], result["behind"] = int(ahead), -int(behind)
+            elif kind in ("1", "2"):
+                # 1 XY sub mH mI mW hH hI path / 2 ... Xscore path, seguido de la ruta original
+                fields = record.split(" ", 8 if kind == "1" else 9)
+                xy, name = fields[1], fields[-1]
+                if kind == "2":
+                    next(records, None)
+                if xy[0] != ".":
+                    result["staged"].append(name)
+                if xy[1] != ".":
+                    result["unstaged"].append(name)
+            elif kind == "u":
+                result["conflicted"].append(record.split(" ", 10)[-1])
+            elif kind == "?":
+                result["untracked"].append(record[2:])
+    except GitCommandError as e:
+        return {"error": str(e)}
+    return result
 
 @mcp.tool()
+@concurrent_tool()
 def git_add(path: str, patterns: List[str]) -> Dict[str, Any]:
     """
     Stage files. `patterns` may include globs (e.g., ["README.md", "src/**/*.py"])
@@ -80,6 +439,7 @@ def git_add(path: str, patterns: List[str]) -> Dict[str, Any]:
         return {"error": str(e), "path": str(_abs(path)), "patterns": patterns}
 
 @mcp.tool()
+@concurrent_tool()
 def git_commit(
     path: str,
     message: str,
@@ -105,6 +465,7 @@ def git_commit(
         return {"error": str(e)}
 
 @mcp.tool()
+@concurrent_tool()
 def git_branch_create(path: str, name: str, checkout: bool = False) -> Dict[str, Any]:
     """
     Create a branch (optionally checkout).
@@ -119,6 +480,7 @@ def git_branch_create(path: str, name: str, checkout: bool = False) -> Dict[str,
         return {"error": str(e)}
 
 @mcp.tool()
+@concurrent_tool()
 def git_checkout(path: str, name: str) -> Dict[str, Any]:
     """
     Checkout an existing branch or ref.
@@ -130,26 +492,80 @@ def git_checkout(path: str, name: str) -> Dict[str, Any]:
     except GitCommandError as e:
         return {"error": str(e)}
 
+DEFAULT_MAX_BYTES = 64 * 1024  # presupuesto por respuesta de git_log / git_diff
+_SHA = re.compile(r"[0-9a-f]{40}([0-9a-f]{24})?")
+
+def _clip(text: str, max_bytes: int) -> str:
+    return text.encode("utf-8")[:max(0, max_bytes)].decode("utf-8", errors="ignore")
+
+def _json_size(value) -> int:
+    return len(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+
+def _log_cursor(cursor: Optional[str]) -> List[str]:
+    if not cursor:
+        return ["HEAD"]
+    starts = cursor.split(",")
+    if not all(_SHA.fullmatch(sha) for sha in starts):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return starts
+
 @mcp.tool()
-def git_log(path: str, max_count: int = 10) -> List[Dict[str, Any]]:
+@concurrent_tool()
+def git_log(path: str, max_count: int = 10, cursor: Optional[str] = None,
+            summary: bool = False, max_bytes: int = DEFAULT_MAX_BYTES) -> Dict[str, Any]:
     """
-    Return recent commits.
+    Return recent commits, newest first, one page at a time.
+    The page ends after `max_count` commits or `max_bytes` of JSON, whichever comes first.
+    summary: only hash, date and the first line of each message.
+    Pass `next_cursor` back as `cursor` to continue where the page ended (None when history ends).
+    Returns: { commits, next_cursor }
     """
-    repo = _open_repo(path)
-    out = []
+    entry = _cached_repo(path)
     try:
-        for c in repo.iter_commits(max_count=max_count):
-            out.append({
-                "hash": c.hexsha[:10],
-                "author": f"{c.author.name} <{c.author.email}>",
-                "date": c.committed_datetime.isoformat(),
-                "message": c.message.strip(),
-            })
-        return out
+        starts = _log_cursor(cursor)
+        if cursor:
+            # Las páginas siguientes no se guardan: cada cursor es distinto y el memo crecería sin fin
+            return _read_log(entry, max_count, starts, summary, max_bytes)
+        key = ("log", max_count, summary, max_bytes)
+        return dict(entry.memoized(key, lambda: _read_log(entry, max_count, starts, summary, max_bytes)))
     except Exception as e:
-        return [{"error": str(e)}]
+        return {"error": str(e)}
+
+def _log_item(c: Dict[str, Any], summary: bool) -> Dict[str, Any]:
+    item = {"hash": c["sha"][:10]}
+    if not summary:
+        item["author"] = c["author"][0].decode("utf-8", errors="replace")
+    item["date"] = _iso_date(*c["committer"][1:])
+    message = c["message"].strip()
+    if summary:
+        item["subject"] = message.split("\n", 1)[0]
+    else:
+        item["message"] = message
+    return item
+
+def _read_log(entry: _CachedRepo, max_count: int, starts: List[str] = ("HEAD",),
+              summary: bool = False, max_bytes: int = DEFAULT_MAX_BYTES) -> Dict[str, Any]:
+    walk = _CommitWalk(entry.repo, entry.cat_file, starts, max(1, max_count))
+    commits, used = [], 0
+    for c in walk:
+        item = _log_item(c, summary)
+        size = _json_size(item)
+        if commits and used + size > max_bytes:
+            walk.push_back(c)
+            break
+        if size > max_bytes:
+            # Un solo commit ya no entra: se recorta el mensaje para avanzar igual
+            text = "subject" if summary else "message"
+            item[text] = _clip(item[text], max_bytes - (size - _json_size(item[text])))
+            item["truncated"] = True
+        commits.append(item)
+        used += size
+        if len(commits) >= max(1, max_count):
+            break
+    return {"commits": commits, "next_cursor": ",".join(walk.frontier()) or None}
 
 @mcp.tool()
+@concurrent_tool()
 def git_remote_add(path: str, name: str, url: str, overwrite: bool = False) -> Dict[str, Any]:
     """
     Add a remote.
@@ -166,15 +582,22 @@ def git_remote_add(path: str, name: str, url: str, overwrite: bool = False) -> D
     except GitCommandError as e:
         return {"error": str(e)}
 
+NETWORK_CALLS = 2  # clone / pull / push simultáneos por herramienta
+
+def _remote_target(path: str, branch: Optional[str]) -> Tuple[Repo, Optional[str]]:
+    # El repo y la rama se leen con el lock del repo, como en el resto de herramientas
+    with _repo_lock(path):
+        return _open_repo(path), branch or _current_branch(path)
+
 @mcp.tool()
-def git_push(path: str, remote: str = "origin", branch: Optional[str] = None,
-             force: bool = False, set_upstream: bool = False) -> Dict[str, Any]:
+@concurrent_tool(NETWORK_CALLS)
+async def git_push(path: str, remote: str = "origin", branch: Optional[str] = None,
+                   force: bool = False, set_upstream: bool = False) -> Dict[str, Any]:
     """
     Push current branch (or provided).
     """
-    repo = _open_repo(path)
+    repo, branch = await _in_pool(_remote_target, path, branch)
     try:
-        branch = branch or _branch_name(repo)
         if branch is None:
             return {"error": "No current branch"}
         args = []
@@ -183,42 +606,121 @@ def git_push(path: str, remote: str = "origin", branch: Optional[str] = None,
         if set_upstream:
             args.append("--set-upstream")
         args += [remote, branch]
-        res = repo.git.push(*args)
+        res = await _run_git(["push", *args], cwd=repo.working_tree_dir)
         return {"path": str(_abs(path)), "remote": remote, "branch": branch, "result": res}
     except GitCommandError as e:
         return {"error": str(e)}
 
 @mcp.tool()
-def git_pull(path: str, remote: str = "origin", branch: Optional[str] = None,
-             rebase: bool = False) -> Dict[str, Any]:
+@concurrent_tool(NETWORK_CALLS)
+async def git_pull(path: str, remote: str = "origin", branch: Optional[str] = None,
+                   rebase: bool = False) -> Dict[str, Any]:
     """
     Pull from remote branch.
     """
-    repo = _open_repo(path)
+    repo, branch = await _in_pool(_remote_target, path, branch)
     try:
-        branch = branch or _branch_name(repo)
         if branch is None:
             return {"error": "No current branch"}
         args = []
         if rebase:
             args.append("--rebase")
         args += [remote, branch]
-        res = repo.git.pull(*args)
+        res = await _run_git(["pull", *args], cwd=repo.working_tree_dir)
         return {"path": str(_abs(path)), "remote": remote, "branch": branch, "result": res}
     except GitCommandError as e:
         return {"error": str(e)}
 
+DIFF_PAGE_SIZE = 50  # archivos por página de git_diff
+DIFF_MODES = ("patch", "stat", "name_only")
+
+def _offset_cursor(cursor: Optional[str]) -> int:
+    if not cursor:
+        return 0
+    if not cursor.isdigit():
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return int(cursor)
+
+def _fit(items: list, max_bytes: int, size) -> list:
+    # Lo que entra en el presupuesto, al menos un elemento para que la página avance
+    out, used = [], 0
+    for item in items:
+        used += size(item)
+        if out and used > max_bytes:
+            break
+        out.append(item)
+    return out
+
+_PATCH_BLOCK = re.compile(r"(?m)^(?=diff --(?:git|cc|combined) |\* Unmerged path )")
+_C_ESCAPES = {"a": 7, "b": 8, "t": 9, "n": 10, "v": 11, "f": 12, "r": 13, '"': 34, "\\": 92}
+
+def _unquote_path(name: str) -> str:
+    # git escribe entre comillas, al estilo C, las rutas con caracteres raros ("t\303\251st.txt")
+    if not name.startswith('"'):
+        return name
+    out, i = bytearray(), 1
+    while i < len(name) - 1:
+        if name[i] != "\\":
+            out += name[i].encode("utf-8")
+            i += 1
+        elif name[i + 1] in "01234567":
+            out.append(int(name[i + 1:i + 4], 8))
+            i += 4
+        else:
+            out.append(_C_ESCAPES.get(name[i + 1], ord(name[i + 1])))
+            i += 2
+    return out.decode("utf-8", errors="replace")
+
+def _patch_path(header: str) -> str:
+    """
+    Path of a patch block from its first line
+    """
+    if header.startswith("diff --git "):
+        # Sin renames a/<ruta> y b/<ruta> son iguales y miden lo mismo
+        rest = header[len("diff --git "):]
+        return _unquote_path(rest[:(len(rest) - 1) // 2])[2:]
+    if header.startswith("* Unmerged path "):
+        return _unquote_path(header[len("* Unmerged path "):])
+    return _unquote_path(header.split(" ", 2)[2])  # diff --cc / --combined
+
+def _numstat(diff, args: List[str], files: List[str]) -> List[Dict[str, Any]]:
+    out = {}
+    for line in diff(*args, "--numstat", "-z", "--", *files).split("\0"):
+        if not line:
+            continue
+        added, deleted, name = line.split("\t", 2)
+        # Un conflicto trae primero una fila 0/0 y después la del diff: queda la última
+        out[name] = {
+            "path": name,
+            "added": None if added == "-" else int(added),  # None: binario
+            "deleted": None if deleted == "-" else int(deleted),
+        }
+    return list(out.values())
+
 @mcp.tool()
+@concurrent_tool()
 def git_diff(path: str, commit_a: Optional[str] = None, commit_b: Optional[str] = None,
-             name_only: bool = False, cached: bool = False) -> Dict[str, Any]:
+             name_only: bool = False, cached: bool = False, mode: str = "patch",
+             cursor: Optional[str] = None, page_size: int = DIFF_PAGE_SIZE,
+             max_bytes: int = DEFAULT_MAX_BYTES) -> Dict[str, Any]:
     """
-    Show diffs between commits or working tree.
+    Show diffs between commits or working tree, one page of files at a time.
+    mode: "patch" (unified diff), "stat" (lines added/deleted per file) or "name_only".
+    A page holds up to `page_size` files and about `max_bytes` of output; a single
+    file bigger than that is cut and flagged `truncated`.
+    Pass `next_cursor` back as `cursor` to get the next page (None on the last one).
+    Returns: { path, mode, files_total, files, diff | stat, next_cursor }
     """
     repo = _open_repo(path)
+    if name_only:
+        mode = "name_only"
+    if mode not in DIFF_MODES:
+        return {"error": f"mode must be one of {', '.join(DIFF_MODES)}"}
     try:
-        args = []
-        if name_only:
-            args.append("--name-only")
+        start = _offset_cursor(cursor)
+        # Los nombres de archivo van como rutas literales (*.py, a[1].txt, :foo) en todas las llamadas
+        diff = functools.partial(repo.git.diff, env={"GIT_LITERAL_PATHSPECS": "1"})
+        args = ["--no-renames"]
         if cached:
             args.append("--cached")
         if commit_a and commit_b:
@@ -226,33 +728,71 @@ def git_diff(path: str, commit_a: Optional[str] = None, commit_b: Optional[str]
         elif commit_a:
             args.append(commit_a)
         # else: diff WT
-        text = repo.git.diff(*args)
-        return {"path": str(_abs(path)), "diff": text}
-    except GitCommandError as e:
+
+        # Primero sólo los nombres, después se pide el contenido de la página
+        # Un conflicto aparece más de una vez
+        names = list(dict.fromkeys(n for n in diff(*args, "--name-only", "-z").split("\0") if n))
+        page = names[start:start + max(1, page_size)]
+        result = {"path": str(_abs(path)), "mode": mode, "files_total": len(names)}
+        if not page:
+            files = []
+        elif mode == "name_only":
+            files = _fit(page, max_bytes, lambda n: len(n.encode("utf-8")) + 4)
+        elif mode == "stat":
+            result["stat"] = _fit(_numstat(diff, args, page), max_bytes, _json_size)
+            files = [s["path"] for s in result["stat"]]
+        else:
+            text = diff(*args, "--src-prefix=a/", "--dst-prefix=b/", "--", *page)
+            # Un archivo puede traer varios bloques (typechange, conflicto) y no siempre en el orden
+            # de names: se agrupan por la ruta del encabezado y se pagina por archivo
+            blocks = {}
+            for block in _PATCH_BLOCK.split(text):
+                if block:
+                    name = _patch_path(block.split("\n", 1)[0])
+                    blocks[name] = blocks.get(name, "") + block
+            patches = _fit([blocks.get(n, "") for n in page], max_bytes, lambda p: len(p.encode("utf-8")))
+            if len(patches) == 1 and len(patches[0].encode("utf-8")) > max_bytes:
+                patches[0] = _clip(patches[0], max_bytes)
+                result["truncated"] = True
+            result["diff"] = "".join(patches)
+            files = page[:len(patches)]
+        end = start + len(files)
+        result["files"] = files
+        result["next_cursor"] = str(end) if end < len(names) else None
+        return result
+    except (GitCommandError, ValueError) as e:
         return {"error": str(e)}
 
 @mcp.tool()
+@concurrent_tool()
 def git_ls_files(path: str) -> List[str]:
     """
     List tracked files.
     """
-    repo = _open_repo(path)
+    entry = _cached_repo(path)
     try:
-        return repo.git.ls_files().splitlines()
-    except GitCommandError as e:
+        return list(entry.memoized("ls_files", lambda: _read_ls_files(entry.repo)))
+    except (GitCommandError, OSError, ValueError) as e:
         return [f"error: {e}"]
 
+def _read_ls_files(repo: Repo) -> List[str]:
+    # git lee cualquier versión del index (GitPython sólo la 1 y la 2); el resultado se
+    # memoiza, así que se lanza una vez por cada cambio del index
+    names = repo.git.ls_files("-z").split("\0")
+    return list(dict.fromkeys(n for n in names if n))  # rutas en conflicto aparecen una vez por stage
+
 @mcp.tool()
-def git_clone(url: str, dest: str, depth: Optional[int] = None) -> Dict[str, Any]:
+@concurrent_tool(NETWORK_CALLS)
+async def git_clone(url: str, dest: str, depth: Optional[int] = None) -> Dict[str, Any]:
     """
     Clone a repository into `dest`.
     """
     d = _abs(dest)
     try:
-        kwargs = {}
+        args = ["clone"]
         if depth:
-            kwargs["depth"] = int(depth)
-        Repo.clone_from(url, d, **kwargs)
+            args += ["--depth", str(int(depth))]
+        await _run_git(args + ["--", url, str(d)])
         return {"dest": str(d), "url": url, "depth": depth}
     except GitCommandError as e:
         return {"error": str(e), "dest": str(d), "url": url}
@@ -6,11 +6,20 @@ import json
 from mcp_host import MCPHost
 import asyncio
 import time
+import signal
+import threading
 # Loading .env
 load_dotenv()
 MODEL = os.getenv("ANTHROPIC_MODEL") if os.getenv("ANTHROPIC_MODEL") else None
 API_KEY = os.getenv("ANTHROPIC_API_KEY") if os.getenv("ANTHROPIC_API_KEY") else None
 MAX_TOKENS = 200
+MAX_STEPS = 8 # Rondas de herramientas permitidas por pregunta
+
+# Manejo de contexto
+CONTEXT_BUDGET = 40_000 # tokens de entrada a partir de los cuales se recorta la conversacion
+CONTEXT_TARGET = 0.6 # fraccion del presupuesto que queda despues de recortar
+ELIDE_TOOL_RESULT_CHARS = 2_000 # resultados viejos mas largos que esto se omiten
+CACHE_CONTROL = {"type": "ephemeral"}
 
 COMMANDS = ["-h", "-t"]
 
@@ -19,13 +28,45 @@ def handle_commands(cm):
         print("\n\t Esto se supone que te ayudara\n")
     if cm == "-t":
         print("\n\t Esto se supone que lista las tools disponibles\n")
+async def ainput(prompt=""):
+    """
+    input() read on a daemon thread, so the event loop keeps serving the MCP
+    sessions while waiting for the user
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def resolve(result=None, error=None):
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def read():
+        try:
+            line = input(prompt)
+        except Exception as e: # EOFError al cerrar stdin
+            loop.call_soon_threadsafe(resolve, None, e)
+        else:
+            loop.call_soon_threadsafe(resolve, line)
+
+    threading.Thread(target=read, name="chat-input", daemon=True).start()
+    return await future
+
 # ---- Chat ----- #
 class Chat():
-    def __init__(self, mcp_host):
-        self.client = anthropic.Anthropic(api_key=API_KEY)
+    def __init__(self, mcp_host, max_steps=MAX_STEPS, context_budget=CONTEXT_BUDGET):
+        self.client = anthropic.AsyncAnthropic(api_key=API_KEY)
         self.mcp_host = mcp_host
+        self.max_steps = max_steps
         self.messages = []
         self.tools = []
+        self.context_budget = context_budget
+        # Ultima medicion de tokens de entrada y caracteres enviados en esa peticion
+        self._last_input_tokens = 0
+        self._last_request_chars = 0
         self.system_propmpt = (
             "Eres un asistente conversacional llamado ChatBot.\n"
             "Tienes acceso a diferentes herramientas (tools) basadas en los servers que te mostraran mas adelante.\n"
@@ -35,105 +76,243 @@ class Chat():
             "Busca contestar de manera concisa y usar apropiadamente las herramientas disponibles\n"
         )
         
-    def test_connection(self):
+    async def test_connection(self):
         try:
-            _ = self.client.messages.create(
+            _ = await self.client.messages.create(
                 model=MODEL,
                 messages=[{"role": "user", "content": [{"type": "text", "text": "hola"}]}],
                 max_tokens=1
             )
-        except:
-            raise("No se pudo establecer conexion con LLM!")
+        except Exception as e:
+            raise ConnectionError("No se pudo establecer conexion con LLM!") from e
     
     def parse_user_msg(self, msg):
         parsed_msg = {"role": "user", "content": [{"type": "text", "text": msg}]}
         return parsed_msg
     
     async def ask(self, msg):
-        
-        self.messages.append(self.parse_user_msg(msg))
+        """
+        Runs the agent loop for one user message: the model is called again after
+        every round of tools until it stops asking for them or max_steps is reached.
+        Text is streamed to the terminal as it arrives; the final text is returned.
+        """
+        history = list(self.messages)
+        user_msg = self.parse_user_msg(msg)
+        if self.messages and self.messages[-1]["role"] == "user":
+            # La ronda anterior termino con tool_results sin respuesta del modelo
+            last = self.messages[-1]
+            self.messages[-1] = {**last, "content": last["content"] + user_msg["content"]}
+        else:
+            self.messages.append(user_msg)
         try:
-            resp = self.client.messages.create(
-                model=MODEL,
-                system=self.system_propmpt,
-                tools=self.mcp_host.tools,
-                messages=self.messages,
-                max_tokens=MAX_TOKENS,
-            )
-            self.messages.append({"role": "assistant", "content": resp.content})
-            self.mcp_host.log("ASSISTANT", f"{resp.content}")
-            tool_uses = [c for c in resp.content if getattr(c, "type", "") == "tool_use"]
-            if tool_uses:
-                tool_results = {}
-                for t in tool_uses: 
-                    name = t.name
-                    args = t.input or {}
-                    self.mcp_host.log("llm.tool_use", f"name: {name}, args: {args}")
-                    # Ejecutar herramienta en MCP
-                    result = await self.mcp_host.call_tool(name, args)
-                    # Devolvemos tool_result al LLM
-                    
-                    if isinstance(result, list):
-                        result_text_blocks = []
-                        for r in result:
-                            if hasattr(r, "text"):
-                                result_text_blocks.append({"type": "text", "text": r.text})
-                    else:
-                        result_text_blocks = [{"type": "text", "text": str(result)}]
-                        
-                    tool_results = {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "tool_result",
-                                "tool_use_id": t.id,
-                                "content": result_text_blocks
-                            }
-                        ]  
-                    }
-        
-
-                self.messages.append(tool_results)
-                resp2 = self.client.messages.create(
-                    model=MODEL,
-                    system=self.system_propmpt,
-                    messages=self.messages,
-                    max_tokens=MAX_TOKENS
-                )
-                
-                self.messages.append({"role": "assistant", "content": resp2.content})
-                
-                final_text = "".join([c.text for c in resp2.content if getattr(c, "type", "") == "text"])
-                return final_text
-            else:
+            final_text = ""
+            for step in range(self.max_steps):
+                if self.estimate_tokens() > self.context_budget:
+                    self.compact_messages()
+                resp = await self.stream_response()
+                self.messages.append({
+                    "role": "assistant",
+                    "content": [c.model_dump(exclude_none=True) for c in resp.content]
+                })
+                self.mcp_host.log("ASSISTANT", f"{resp.content}")
                 final_text = "".join([c.text for c in resp.content if getattr(c, "type", "") == "text"])
-                return final_text
+                if resp.stop_reason != "tool_use":
+                    return final_text
+
+                tool_uses = [c for c in resp.content if getattr(c, "type", "") == "tool_use"]
+                # Ejecutar todas las herramientas en paralelo, los resultados conservan el orden
+                tool_results = await asyncio.gather(*(self.run_tool(t) for t in tool_uses))
+                self.messages.append({"role": "user", "content": list(tool_results)})
 
+            self.mcp_host.log("WARNING", f"Reached max_steps ({self.max_steps}) while the model still wanted tools")
+            return final_text
+
+        except asyncio.CancelledError:
+            # Una pregunta cancelada no deja tool_use sin respuesta en el historial
+            self.messages = history
+            raise
         except Exception as e:
             print(f"connection error: {e}")
 
-    async def query_llm(self):
-        
-        try:
-            while(True):
-                raw = input("> ") # Fetch input
-                user_input = raw.strip() # Clean spaces
-                if (user_input in COMMANDS):
-                    handle_commands(user_input)
-                    if user_input == "-t":
-                        print(f"Tools disponibles: {[tool['name'] for tool in self.mcp_host.tools]}")
+    async def stream_response(self):
+        """
+        Sends the conversation to the model, printing text tokens as they arrive,
+        and returns the complete message.
+        """
+        request = self.build_request()
+        async with self.client.messages.stream(model=MODEL, max_tokens=MAX_TOKENS, **request) as stream:
+            streamed = False
+            async for text in stream.text_stream:
+                print(text, end="", flush=True)
+                streamed = True
+            if streamed:
+                print()
+            resp = await stream.get_final_message()
+
+        usage = resp.usage
+        self._last_input_tokens = (
+            usage.input_tokens
+            + (usage.cache_creation_input_tokens or 0)
+            + (usage.cache_read_input_tokens or 0)
+        )
+        self._last_request_chars = self.request_chars(request)
+        self.mcp_host.log("USAGE", {
+            "input_tokens": usage.input_tokens,
+            "cache_creation_input_tokens": usage.cache_creation_input_tokens,
+            "cache_read_input_tokens": usage.cache_read_input_tokens,
+            "output_tokens": usage.output_tokens
+        })
+        return resp
+
+    # ---- Contexto ---- #
+    def build_request(self):
+        """
+        System prompt, tools and messages with cache breakpoints at the end of each
+        stable part: the system prompt, the last tool and the last message so far.
+        """
+        system = [{"type": "text", "text": self.system_propmpt, "cache_control": CACHE_CONTROL}]
+        tools = list(self.mcp_host.tools)
+        if tools:
+            tools[-1] = {**tools[-1], "cache_control": CACHE_CONTROL}
+        messages = list(self.messages)
+        if messages and messages[-1]["content"]:
+            last = messages[-1]
+            content = list(last["content"])
+            content[-1] = {**content[-1], "cache_control": CACHE_CONTROL}
+            messages[-1] = {**last, "content": content}
+        return {"system": system, "tools": tools, "messages": messages}
+
+    def request_chars(self, request):
+        return len(json.dumps(request, ensure_ascii=False, default=str))
+
+    def estimate_tokens(self):
+        """
+        Input tokens the next request would use, scaled from the last measured request
+        """
+        if not self._last_request_chars:
+            return 0
+        tokens_per_char = self._last_input_tokens / self._last_request_chars
+        return int(self.request_chars(self.build_request()) * tokens_per_char)
+
+    def turn_starts(self):
+        # Un turno empieza con un mensaje del usuario que trae texto (no solo tool_results)
+        return [
+            i for i, m in enumerate(self.messages)
+            if m["role"] == "user" and any(b.get("type") == "text" for b in m["content"])
+        ]
+
+    def compact_messages(self):
+        """
+        Brings the conversation under the token budget: large tool results from older
+        turns are elided first, then whole turns are dropped from the start. The latest
+        turn is never touched. Compacting changes the cached prefix, so it only happens
+        when the budget is exceeded and leaves room for several more turns.
+        """
+        starts = self.turn_starts()
+        if len(starts) < 2:
+            return
+        before = self.estimate_tokens()
+        target = self.context_budget * CONTEXT_TARGET
+
+        elided = 0
+        for m in self.messages[:starts[-1]]:
+            if m["role"] != "user":
+                continue
+            for block in m["content"]:
+                if block.get("type") != "tool_result":
                     continue
-                if (user_input.startswith("-q" )):
-                    prompt = user_input[2:].strip()
-                    print(f"Your prompt was: \'{prompt}\'")
-                    # Prompt llm
-                    content = await self.ask(prompt)
-                    print(f"ChatBot > {content}\n\n")
-                else:
-                    print("[COMMAND NOT RECOGNIZED] must start with at least one indicator, you can use \'-h\' to list them")
+                size = sum(len(c.get("text", "")) for c in block.get("content", []))
+                if size > ELIDE_TOOL_RESULT_CHARS:
+                    block["content"] = [{"type": "text", "text": f"[resultado omitido: {size} caracteres]"}]
+                    elided += 1
+
+        dropped = 0
+        while dropped < len(starts) - 1 and self.estimate_tokens() > target:
+            dropped += 1
+            self.messages = self.messages[starts[dropped] - starts[dropped - 1]:]
+        if dropped:
+            # Tras max_steps la pregunta siguiente va junto a tool_results cuyo tool_use ya se borro
+            first = self.messages[0]
+            content = [b for b in first["content"] if b.get("type") != "tool_result"]
+            self.messages[0] = {**first, "content": content}
+
+        self.mcp_host.log("CONTEXT", f"Compacted conversation from ~{before} to ~{self.estimate_tokens()} tokens "
+                                     f"({elided} tool results elided, {dropped} turns dropped)")
+
+    async def run_tool(self, tool_use):
+        """
+        Runs one tool_use block through MCP and returns its tool_result block
+        """
+        name = tool_use.name
+        args = tool_use.input or {}
+        self.mcp_host.log("llm.tool_use", f"name: {name}, args: {args}")
+        try:
+            result = await self.mcp_host.call_tool(name, args)
+        except Exception as e:
+            return {
+                "type": "tool_result",
+                "tool_use_id": tool_use.id,
+                "content": [{"type": "text", "text": f"Error: {e}"}],
+                "is_error": True
+            }
 
-        except KeyboardInterrupt:
-            print("Closed!")
+        # Devolvemos tool_result al LLM
+        if isinstance(result, list):
+            result_text_blocks = []
+            for r in result:
+                if hasattr(r, "text"):
+                    result_text_blocks.append({"type": "text", "text": r.text})
+                elif isinstance(r, dict) and "text" in r:
+                    result_text_blocks.append({"type": "text", "text": r["text"]})
+        else:
+            result_text_blocks = [{"type": "text", "text": str(result)}]
+
+        return {
+            "type": "tool_result",
+            "tool_use_id": tool_use.id,
+            "content": result_text_blocks
+        }
+
+    async def run_cancellable(self, coro):
+        """
+        Runs coro as a task that Ctrl-C cancels, without closing the chat
+        """
+        loop = asyncio.get_running_loop()
+        task = asyncio.ensure_future(coro)
+        previous = signal.signal(signal.SIGINT, lambda *_: loop.call_soon_threadsafe(task.cancel))
+        try:
+            return await task
+        except asyncio.CancelledError:
+            # Solo se absorbe la cancelacion pedida con Ctrl-C
+            if not task.cancelled() or asyncio.current_task().cancelling():
+                raise
+            print("\n[cancelado]")
+        finally:
+            signal.signal(signal.SIGINT, previous)
+
+    async def query_llm(self):
+        
+        while(True):
+            try:
+                raw = await ainput("> ") # Fetch input
+            except EOFError:
+                print("Closed!")
+                return
+            user_input = raw.strip() # Clean spaces
+            if (user_input in COMMANDS):
+                handle_commands(user_input)
+                if user_input == "-t":
+                    print(f"Tools disponibles: {[tool['name'] for tool in self.mcp_host.tools]}")
+                continue
+            if (user_input.startswith("-q" )):
+                prompt = user_input[2:].strip()
+                print(f"Your prompt was: \'{prompt}\'")
+                # Prompt llm, la respuesta se imprime mientras llega
+                print("ChatBot > ", end="", flush=True)
+                await self.run_cancellable(self.ask(prompt))
+                print("\n")
+            else:
+                print("[COMMAND NOT RECOGNIZED] must start with at least one indicator, you can use \'-h\' to list them")
 
 
 
@@ -141,14 +320,15 @@ class Chat():
 async def async_main():
     mcph = MCPHost()
     await mcph.start_servers()
-    await mcph.expose_tools()
-    # await mcph.stop_servers()
-    chatbot = Chat(mcph)
-    await chatbot.query_llm()
-    # await chatbot.expose_tools()
+    try:
+        await mcph.expose_tools()
+        chatbot = Chat(mcph)
+        await chatbot.query_llm()
+    finally:
+        await mcph.stop_servers()
     
 if __name__ == "__main__":
-    asyncio.run(async_main())
-
-    
-    
+    try:
+        asyncio.run(async_main())
+    except KeyboardInterrupt:
+        print("Closed!")
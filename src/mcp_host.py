@@ -4,38 +4,277 @@ import datetime
 from pathlib import Path
 from contextlib import AsyncExitStack
 import subprocess
-from mcp import ClientSession, StdioServerParameters
+from mcp import ClientSession, StdioServerParameters, types
 from mcp.client.stdio import stdio_client
 from mcp.client.sse import sse_client
 from importlib import import_module
 import aiohttp
 import sys
 import traceback
+import atexit
+import queue
+import threading
+import time
+from collections import Counter
 
 CONFIG_PATH = Path("./host_config.json")
 
+# Logging
+LOG_MAX_BYTES = 10 * 1024 * 1024  # rotate after 10 MB
+LOG_BACKUP_COUNT = 3
+LOG_QUEUE_SIZE = 10_000
+LOG_BATCH_SIZE = 512
+LOG_BUFFER_SIZE = 64 * 1024
+_LOG_STOP = object()
+
+# Seconds a server gets to answer its initialize handshake
+STARTUP_TIMEOUT = 20.0
+
+# Tool calls allowed in flight on one server, overridable with "max_concurrency"
+MAX_CONCURRENT_CALLS = 4
+
+# Raw SSH transport
+SSH_REQUEST_TIMEOUT = 60.0
+SSH_READ_LIMIT = 16 * 1024 * 1024  # longest JSON-RPC line accepted from the server
+
+# Seconds before the tool routing index is rebuilt from the servers
+TOOLS_TTL = 300.0
+
+# Bytes of text a tool result may hand to the model, overridable with "max_result_bytes"
+MAX_RESULT_BYTES = 256 * 1024
+
 
 class Logger():
-    def __init__(self, path="logs/mcp-log.jsonl"):
+    """
+    Append-only JSON Lines logger.
+    Entries are queued and written by a background thread to a buffered file
+    handle that stays open, so the cost of a log call does not depend on how
+    big the log already is.
+    """
+    def __init__(self, path="logs/mcp-log.jsonl", max_bytes=LOG_MAX_BYTES,
+                 backup_count=LOG_BACKUP_COUNT, queue_size=LOG_QUEUE_SIZE):
         self.path = Path(path)
         self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._closed = False
+        self._migrate_legacy_file()
+        self._file = self.path.open("a", encoding="utf-8", buffering=LOG_BUFFER_SIZE)
+        self._size = self._file.tell()
+        self._thread = threading.Thread(target=self._run, name="mcp-logger", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
     def write(self, type, payload):
+        if self._closed:
+            return
         log = {
             "time": str(datetime.datetime.now()),
             "type": type,
             "payload": payload
         }
+        try:
+            self._queue.put_nowait(log)
+        except queue.Full:
+            # Never block the caller (usually the event loop) on disk I/O
+            self.dropped += 1
+
+    def close(self):
+        """Flush every pending entry and close the file."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_LOG_STOP)
+        self._thread.join()
+        self._file.close()
+
+    # Writer thread
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # Drain whatever else is already queued so it is written in one go
+            while len(batch) < LOG_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = _LOG_STOP in batch
+            self._write_batch([log for log in batch if log is not _LOG_STOP])
+            if stop:
+                return
+
+    def _write_batch(self, batch):
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            batch.append({
+                "time": str(datetime.datetime.now()),
+                "type": "LOGGER",
+                "payload": f"Dropped {dropped} log entries, queue was full"
+            })
+        for log in batch:
+            line = json.dumps(log, ensure_ascii=True, separators=(",", ":"), default=str) + "\n"
+            if self.max_bytes and self._size + len(line) > self.max_bytes and self._size > 0:
+                self._rotate()
+            self._file.write(line)
+            self._size += len(line)
+        self._file.flush()
+
+    def _rotate(self):
+        # logs/mcp-log.jsonl -> logs/mcp-log.jsonl.1 -> ... -> .<backup_count>
+        self._file.close()
+        if self.backup_count > 0:
+            for i in range(self.backup_count - 1, 0, -1):
+                src = self.path.with_name(f"{self.path.name}.{i}")
+                if src.exists():
+                    src.replace(self.path.with_name(f"{self.path.name}.{i + 1}"))
+            self.path.replace(self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink(missing_ok=True)
+        self._file = self.path.open("a", encoding="utf-8", buffering=LOG_BUFFER_SIZE)
+        self._size = 0
+
+    def _migrate_legacy_file(self):
+        # Older versions rewrote the log as one pretty printed JSON array
         try:
             with self.path.open("r", encoding="utf-8") as f:
+                if f.read(1) != "[":
+                    return
+                f.seek(0)
                 logs = json.load(f)
         except (FileNotFoundError, json.JSONDecodeError):
-            logs = []
+            return
+        with self.path.open("w", encoding="utf-8") as f:
+            for log in logs:
+                f.write(json.dumps(log, ensure_ascii=True, separators=(",", ":")) + "\n")
 
-        logs.append(log)
 
-        # rewrite with pretty formatting
-        with self.path.open("w", encoding="utf-8") as f:
-            json.dump(logs, f, ensure_ascii=True, indent=4)
+class SSHConnection():
+    """
+    JSON-RPC connection to an MCP server reached through a raw ssh subprocess.
+    A single reader task matches every reply to its pending request by id, so
+    several requests can be in flight on the same channel, and notifications
+    sent by the server are dispatched as they arrive.
+    """
+    def __init__(self, name, process, log, on_notification=None):
+        self.name = name
+        self.process = process
+        self.log = log
+        self.on_notification = on_notification
+        self._pending: dict[int, asyncio.Future] = {}
+        self._next_id = 1
+        self._write_lock = asyncio.Lock()
+        self._tasks = []
+
+    def start(self):
+        self._tasks = [
+            asyncio.create_task(self._read_loop(), name=f"ssh-reader-{self.name}"),
+            asyncio.create_task(self._drain_stderr(), name=f"ssh-stderr-{self.name}"),
+        ]
+
+    @property
+    def reader(self):
+        """Task reading the server's output, it ends when the connection closes"""
+        return self._tasks[0]
+
+    async def request(self, method, params=None, timeout=SSH_REQUEST_TIMEOUT):
+        """Sends a request and waits for the reply with the same id, returns its result"""
+        if not self._tasks or self._tasks[0].done():
+            raise ConnectionError(f"Server [{self.name}] connection is closed")
+        request_id = self._next_id
+        self._next_id += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            await self._send({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params or {}})
+            response = await asyncio.wait_for(future, timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            # Let the server stop working on it
+            await self._cancel_remote(request_id)
+            raise
+        finally:
+            self._pending.pop(request_id, None)
+        if "error" in response:
+            raise Exception(f"{method} failed: {response['error']}")
+        return response.get("result", {})
+
+    async def notify(self, method, params=None):
+        message = {"jsonrpc": "2.0", "method": method}
+        if params is not None:
+            message["params"] = params
+        await self._send(message)
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self.process.returncode is None:
+            self.process.terminate()
+            await self.process.wait()
+
+    async def _send(self, message):
+        data = (json.dumps(message) + "\n").encode()
+        async with self._write_lock:
+            self.process.stdin.write(data)
+            await self.process.stdin.drain()
+
+    async def _cancel_remote(self, request_id):
+        try:
+            await self.notify("notifications/cancelled", {"requestId": request_id, "reason": "cancelled by host"})
+        except Exception:
+            pass
+
+    async def _read_loop(self):
+        try:
+            while True:
+                line = await self.process.stdout.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except json.JSONDecodeError as e:
+                    self.log("ERROR", f"Server [{self.name}] invalid JSON: {e}")
+                    continue
+
+                if "method" not in message:
+                    # Reply to one of our requests
+                    future = self._pending.get(message.get("id"))
+                    if future is not None and not future.done():
+                        future.set_result(message)
+                    else:
+                        self.log("DEBUG", f"Server [{self.name}] reply to unknown request: {message}")
+                elif "id" in message:
+                    await self._answer_request(message)
+                elif self.on_notification is not None:
+                    self.on_notification(self.name, message)
+        except Exception as e:
+            self.log("ERROR", f"Server [{self.name}] reader stopped: {type(e).__name__}: {e}")
+        finally:
+            error = ConnectionError(f"Server [{self.name}] connection closed")
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(error)
+
+    async def _answer_request(self, message):
+        # Requests coming from the server; the host only knows how to answer pings
+        if message["method"] == "ping":
+            reply = {"jsonrpc": "2.0", "id": message["id"], "result": {}}
+        else:
+            reply = {
+                "jsonrpc": "2.0",
+                "id": message["id"],
+                "error": {"code": -32601, "message": f"Method not found: {message['method']}"}
+            }
+        await self._send(reply)
+
+    async def _drain_stderr(self):
+        # An unread stderr pipe would eventually block the remote process
+        while True:
+            line = await self.process.stderr.readline()
+            if not line:
+                return
+            self.log("STDERR", f"Server [{self.name}] {line.decode(errors='replace').rstrip()}")
 
 
 class MCPHost():
@@ -48,8 +287,17 @@ class MCPHost():
         self.contexts = {}
         self._connections = {}
         self.tools = []
+        self.tool_index = {}  # exposed tool name -> (server name, tool name on server)
+        self._server_tools = {}
+        self._tools_loaded_at = 0.0
+        self._tools_stale = False
+        self._tools_lock = asyncio.Lock()
+        self._call_limits: dict[str, asyncio.Semaphore] = {}
         self.config = self.load_config()
-        self._stack: AsyncExitStack | None = None
+        self.tools_ttl = self.config.get("tools_ttl", TOOLS_TTL)
+        self.max_result_bytes = self.config.get("max_result_bytes", MAX_RESULT_BYTES)
+        self._server_tasks: dict[str, asyncio.Task] = {}
+        self._shutdown = asyncio.Event()
         self._http_session: aiohttp.ClientSession | None = None
     
     def load_config(self):
@@ -64,289 +312,295 @@ class MCPHost():
         
     # MCP Tool management
     async def expose_tools(self):
-        self.tools.clear()
         print("Loading tools from server:")
-        for name, session in self.sessions.items():
-            
-            try:
-                # Check if this is a raw SSH session
-                if isinstance(session, dict) and 'process' in session:
-                    # Handle SSH session - send tools/list request
-                    list_tools_msg = {
-                        "jsonrpc": "2.0",
-                        "id": 2,
-                        "method": "resources/list",
-                        "params": {"resource": "tools"}
-                    }
-
-                    session['message_id'] = 2
-                    await self._send_message(session['process'], list_tools_msg)
-                    response = await self._read_response(session['process'], name)
-                    print(f"Resp: {response}")
-                    if response and 'result' in response:
-                        tools = response['result'].get('tools', [])
-                        for tool in tools:
-                            self.tools.append({
-                                "name": tool['name'],
-                                "description": f"[{name}] {tool.get('description', '')}",
-                                "input_schema": tool.get('inputSchema', {})
-                            })
-                        self.log("TOOLS", f"Loaded {len(tools)} tools from SSH server [{name}]")
-                    else:
-                        self.log("TOOLS", f"Failed to get tools from SSH server [{name}]: {response}")
-                        
-                else:
-                    # Handle regular MCP session (your existing code)
-                    tools_response = await session.list_tools()
-                    for tool in tools_response.tools:
-                        self.tools.append({
-                            "name": tool.name,
-                            "description": f"[{name}] {tool.description or ''}",
-                            "input_schema": tool.inputSchema
-                        })
-                    self.log("TOOLS", f"Loaded {len(tools_response.tools)} tools from MCP server [{name}]")
-
-            except Exception as e:
-                self.log("TOOLS", f"Failed to load tools from [{name}]: {type(e).__name__}: {e}")
+        await self.refresh_tools()
 
-    ## Tool calling
-    async def call_tool(self, tool_name: str, arguments: dict = None):
-        """Call a tool by name with arguments"""
-        # Find which server has this tool
-        tool_server = None
-        for name, session in self.sessions.items():
-            try:
-                tools_response = await session.list_tools()
-                if any(tool.name == tool_name for tool in tools_response.tools):
-                    tool_server = name
-                    break
-            except Exception:
-                continue
-        
-        if not tool_server:
+    async def refresh_tools(self):
+        """
+        Rebuild the tool list and the tool name -> server routing index.
+        Tool names offered by more than one server are exposed as '<server>__<tool>'.
+        """
+        async with self._tools_lock:
+            for name in list(self._server_tools):
+                if name not in self.sessions:
+                    # Server offline: its tools stop being offered
+                    del self._server_tools[name]
+            for name, session in self.sessions.items():
+                try:
+                    self._server_tools[name] = await self._list_server_tools(name, session)
+                    self.log("TOOLS", f"Loaded {len(self._server_tools[name])} tools from server [{name}]")
+                except Exception as e:
+                    # Keep whatever this server offered last time
+                    self.log("TOOLS", f"Failed to load tools from [{name}]: {type(e).__name__}: {e}")
+
+            counts = Counter(tool["name"] for tools in self._server_tools.values() for tool in tools)
+            tools, index = [], {}
+            for server, server_tools in self._server_tools.items():
+                for tool in server_tools:
+                    exposed = tool["name"]
+                    if counts[exposed] > 1:
+                        exposed = f"{server}__{tool['name']}"
+                        self.log("TOOLS", f"Tool '{tool['name']}' exists in several servers, exposing it as '{exposed}'")
+                    index[exposed] = (server, tool["name"])
+                    tools.append({
+                        "name": exposed,
+                        "description": f"[{server}] {tool['description']}",
+                        "input_schema": tool["input_schema"]
+                    })
+
+            self.tools[:] = tools
+            self.tool_index = index
+            self._tools_loaded_at = time.monotonic()
+            self._tools_stale = False
+
+    async def _list_server_tools(self, name, session):
+        if isinstance(session, SSHConnection):
+            result = await session.request("tools/list")
+            return [{
+                "name": tool['name'],
+                "description": tool.get('description') or '',
+                "input_schema": tool.get('inputSchema', {})
+            } for tool in result.get('tools', [])]
+
+        tools_response = await session.list_tools()
+        return [{
+            "name": tool.name,
+            "description": tool.description or '',
+            "input_schema": tool.inputSchema
+        } for tool in tools_response.tools]
+
+    async def _route(self, tool_name):
+        """Returns (server name, tool name on that server) for an exposed tool name"""
+        if self._tools_stale or time.monotonic() - self._tools_loaded_at > self.tools_ttl:
+            await self.refresh_tools()
+        route = self.tool_index.get(tool_name)
+        if route is None:
             raise ValueError(f"Tool '{tool_name}' not found in any server")
-        
-        try:
-            session = self.sessions[tool_server]
-            response = await session.call_tool(tool_name, arguments or {})
-            self.log("TOOL", f"Called tool '{tool_name}' on server [{tool_server}]")
-            return response.content
-        except Exception as e:
-            self.log("ERROR", f"Failed to call tool '{tool_name}': {e}")
-            raise
-    
+        return route
+
+    def _message_handler(self, name):
+        # Marks the routing index as stale when a server reports new tools
+        async def handler(message):
+            if isinstance(message, types.ServerNotification) and \
+                    isinstance(message.root, types.ToolListChangedNotification):
+                self.log("TOOLS", f"Server [{name}] tool list changed")
+                self._tools_stale = True
+        return handler
+
+    def _on_ssh_notification(self, name, message):
+        if message["method"] == "notifications/tools/list_changed":
+            self.log("TOOLS", f"Server [{name}] tool list changed")
+            self._tools_stale = True
+        else:
+            self.log("NOTIFICATION", f"Server [{name}] {message['method']}: {message.get('params')}")
+
     # Start/stop servers
     async def start_servers(self):
-        self._stack = AsyncExitStack()
-        for server in self.config.get("servers", []):
-            name = server.get("name", "unknown")
-            server_type = server.get("transport", "stdio")
-            command = server.get("command")
-            if command == "ssh":
-                self.log("DETECTED", f"Server [{name}] of transport type \'stdio\' with ssh command")
-                await self.start_ssh_server(server)
-            elif server_type == "stdio":
-                self.log("DETECTED", f"Server [{name}] of transport type \'stdio\'")
-                await self.start_stdio_servers(server)
-            else: 
-                self.log("ERROR", f"Unknown transport type '{server_type}' for server [{name}]")
-                
-                
-    async def _send_message(self, process, message):
-        """Helper to send JSON message to process"""
-        import json
-        message_str = json.dumps(message) + "\n"
-        print(f"MSG: {message_str}")
-        process.stdin.write(message_str.encode())
-        await process.stdin.drain()
-
-    async def _read_response(self, process, name):
-        """Helper to read JSON response from process"""
-        import json
+        """
+        Starts every configured server concurrently. A server counts as ready once its
+        initialize handshake answers; slow or failing servers do not hold back the rest.
+        """
+        self._shutdown = asyncio.Event()
+        async with asyncio.TaskGroup() as tg:
+            for server in self.config.get("servers", []):
+                tg.create_task(self._start_server(server))
+
+    async def _start_server(self, server):
+        name = server.get("name", "unknown")
+        server_type = server.get("transport", "stdio")
+        command = server.get("command")
+        if command == "ssh":
+            self.log("DETECTED", f"Server [{name}] of transport type \'stdio\' with ssh command")
+            runner = self.start_ssh_server
+        elif server_type == "stdio":
+            self.log("DETECTED", f"Server [{name}] of transport type \'stdio\'")
+            runner = self.start_stdio_servers
+        else: 
+            self.log("ERROR", f"Unknown transport type '{server_type}' for server [{name}]")
+            return
+
+        # The server lives in its own task, which owns its transport until stop_servers
+        ready = asyncio.get_running_loop().create_future()
+        task = asyncio.create_task(runner(server, ready), name=f"mcp-server-{name}")
+        self._server_tasks[name] = task
+        timeout = server.get("timeout", STARTUP_TIMEOUT)
         try:
-            response_line = await asyncio.wait_for(process.stdout.readline(), timeout=10.0)
-            response_json = json.loads(response_line.decode())
-            self.log("DEBUG", f"Server [{name}] response: {response_json}")
-            return response_json
+            await asyncio.wait_for(ready, timeout)
+            print(f"[{name}] - Online")
         except asyncio.TimeoutError:
-            self.log("ERROR", f"Server [{name}] timeout reading response")
-            return None
-        except json.JSONDecodeError as e:
-            self.log("ERROR", f"Server [{name}] invalid JSON: {e}")
-            return None
+            self.log("ERROR", f"Server [{name}] did not finish initializing within {timeout}s")
+            task.cancel()
+            print(f"[{name}] - Offline")
+        except Exception:
+            # The runner already logged why
+            print(f"[{name}] - Offline")
                 
                 
+    ## Tool calling
     async def call_tool(self, tool_name: str, arguments: dict = None):
         """Call a tool by name with arguments"""
-        # Find which server has this tool
-        tool_server = None
-        
-        for name, session in self.sessions.items():
-            # Check if this is a raw SSH session
-            if isinstance(session, dict) and 'process' in session:
-                # List tools from SSH session
-                list_tools_msg = {
-                    "jsonrpc": "2.0",
-                    "id": session['message_id'],
-                    "method": "tools/list",
-                    "params": {}
-                }
-                session['message_id'] += 1
-                
-                await self._send_message(session['process'], list_tools_msg)
-                response = await self._read_response(session['process'], name)
-                
-                if response and 'result' in response:
-                    tools = response['result'].get('tools', [])
-                    if any(tool['name'] == tool_name for tool in tools):
-                        tool_server = name
-                        break
-            else:
-                # Handle regular MCP sessions (your existing code)
-                try:
-                    tools_response = await session.list_tools()
-                    if any(tool.name == tool_name for tool in tools_response.tools):
-                        tool_server = name
-                        break
-                except Exception:
-                    continue
-        
-        if not tool_server:
-            raise ValueError(f"Tool '{tool_name}' not found in any server")
+        tool_server, server_tool_name = await self._route(tool_name)
         
         try:
-            session = self.sessions[tool_server]
-            # Handle SSH session
-            if isinstance(session, dict) and 'process' in session:
-                call_tool_msg = {
-                    "jsonrpc": "2.0",
-                    "id": session['message_id'],
-                    "method": "tools/call",
-                    "params": {
-                        "name": tool_name,
-                        "arguments": arguments or {}
-                    }
-                }
-                session['message_id'] += 1
-                
-                await self._send_message(session['process'], call_tool_msg)
-                response = await self._read_response(session['process'], tool_server)
-                
-                if response and 'result' in response:
-                    self.log("TOOL", f"Called tool '{tool_name}' on server [{tool_server}]")
-                    return response['result'].get('content', [])
-                else:
-                    raise Exception(f"Tool call failed: {response}")
-                    
-            else:
-                # Handle regular MCP session (your existing code)
-                response = await session.call_tool(tool_name, arguments or {})
-                self.log("TOOL", f"Called tool '{tool_name}' on server [{tool_server}]")
-                return response.content
-                
+            session = self.sessions.get(tool_server)
+            if session is None:
+                raise ConnectionError(f"Server [{tool_server}] is offline")
+            async with self._call_limit(tool_server):
+                content = await self._call_server_tool(session, tool_server, tool_name, server_tool_name, arguments)
         except Exception as e:
             self.log("ERROR", f"Failed to call tool '{tool_name}': {e}")
             raise
+        return self._bound_result(tool_name, content)
+
+    def _bound_result(self, tool_name, content):
+        """
+        Cuts the text blocks of a tool result once they add up to max_result_bytes,
+        so a single call can never flood the model context
+        """
+        budget = self.max_result_bytes
+        bounded = []
+        for block in content:
+            text = block.get("text") if isinstance(block, dict) else getattr(block, "text", None)
+            if not isinstance(text, str):
+                bounded.append(block)
+                continue
+            data = text.encode("utf-8")
+            if len(data) > budget:
+                dropped = len(data) - budget
+                text = data[:budget].decode("utf-8", errors="ignore")
+                text += f"\n[truncated {dropped} bytes, ask the tool for a smaller page]"
+                self.log("WARNING", f"Result of tool '{tool_name}' truncated by {dropped} bytes")
+                block = {**block, "text": text} if isinstance(block, dict) else block.model_copy(update={"text": text})
+            budget = max(0, budget - len(data))
+            bounded.append(block)
+        return bounded
+
+    def _call_limit(self, server_name):
+        # Bounds how many calls run at once on a single server
+        if server_name not in self._call_limits:
+            server = next((s for s in self.config.get("servers", []) if s.get("name") == server_name), {})
+            self._call_limits[server_name] = asyncio.Semaphore(server.get("max_concurrency", MAX_CONCURRENT_CALLS))
+        return self._call_limits[server_name]
+
+    async def _call_server_tool(self, session, tool_server, tool_name, server_tool_name, arguments):
+        # Handle SSH session
+        if isinstance(session, SSHConnection):
+            result = await session.request("tools/call", {
+                "name": server_tool_name,
+                "arguments": arguments or {}
+            })
+            self.log("TOOL", f"Called tool '{tool_name}' on server [{tool_server}]")
+            return result.get('content', [])
 
-    async def start_ssh_server(self, server_config):
-        if "command" in server_config and "args" in server_config:
-            name, command, args = server_config["name"], server_config["command"], server_config["args"]
+        response = await session.call_tool(server_tool_name, arguments or {})
+        self.log("TOOL", f"Called tool '{tool_name}' on server [{tool_server}]")
+        return response.content
+
+    async def start_ssh_server(self, server_config, ready):
+        if "command" not in server_config or "args" not in server_config:
+            self.log("WARNING", f"Server [{server_config.get('name')}] doesnt have command/args so it will be skipped")
+            ready.set_exception(ValueError("missing command/args"))
+            return
+        name, command, args = server_config["name"], server_config["command"], server_config["args"]
+        process = connection = None
+        try:
+            self.log("DEBUG", f"Server [{name}] creating raw subprocess...")
+            
+            # Create subprocess directly
+            process = await asyncio.create_subprocess_exec(
+                *([command] + args),
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                limit=SSH_READ_LIMIT
+            )
             
+            self.log("DEBUG", f"Server [{name}] SSH process created, PID: {process.pid}")
+            connection = SSHConnection(name, process, self.log, self._on_ssh_notification)
+            connection.start()
+            
+            # The answer to initialize is the readiness probe
+            await connection.request("initialize", {
+                "protocolVersion": "2024-11-05",
+                "capabilities": {},
+                "clientInfo": {"name": "mcp-host", "version": "1.0.0"}
+            })
+            await connection.notify("notifications/initialized")
+            self.log("DEBUG", f"Server [{name}] initialization successful")
+            
+            self.sessions[name] = connection
+            self.log("ONLINE", f"Server [{name}] is online and ready for calls!")
+            if not ready.done():
+                ready.set_result(connection)
+            # Stay online until shutdown, or until the server process dies
+            shutdown = asyncio.create_task(self._shutdown.wait())
             try:
-                self.log("DEBUG", f"Server [{name}] creating raw subprocess...")
-                
-                # Create subprocess directly
-                process = await asyncio.create_subprocess_exec(
-                    *([command] + args),
-                    stdin=asyncio.subprocess.PIPE,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE
-                )
-                
-                self.log("DEBUG", f"Server [{name}] SSH process created, PID: {process.pid}")
-                
-                # Give it a moment to establish
-                await asyncio.sleep(2.0)
-                
-                # Check if process is still alive
-                if process.returncode is not None:
-                    stderr_data = await process.stderr.read()
-                    self.log("ERROR", f"Server [{name}] SSH process died immediately: {stderr_data.decode()}")
-                    raise Exception(f"SSH process exited with code {process.returncode}")
-                
-                self.log("DEBUG", f"Server [{name}] SSH process is alive, testing communication...")
-                
-                # Send initialize message
-                import json
-                init_message = {
-                    "jsonrpc": "2.0",
-                    "id": 1,
-                    "method": "initialize",
-                    "params": {
-                        "protocolVersion": "2024-11-05",
-                        "capabilities": {},
-                        "clientInfo": {"name": "mcp-host", "version": "1.0.0"}
-                    }
-                }
-                
-                await self._send_message(process, init_message)
-                response = await self._read_response(process, name)
-                print(f"Resp: {response}")
-                if not response:
-                    raise Exception("Failed to initialize")
-                
-                self.log("DEBUG", f"Server [{name}] initialization successful")
-                
-                # Store the process and create a wrapper for easy communication
-                ssh_session = {
-                    'process': process,
-                    'name': name,
-                    'message_id': 2  # Start at 2 since we used 1 for initialize
-                }
-                
-                self.sessions[name] = ssh_session
-                self.log("ONLINE", f"Server [{name}] is online and ready for calls!")
-                print(f"[{name}] - Online")
-                
-            except Exception as e:
-                self.log("ERROR", f"Failed to start server [{name}]: {type(e).__name__}: {e}")
-                print(f"[{name}] - Offline")
+                await asyncio.wait({shutdown, connection.reader}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                shutdown.cancel()
+            if not self._shutdown.is_set():
+                self.log("WARNING", f"Server [{name}] connection closed, its tools are no longer offered")
+            
+        except Exception as e:
+            self.log("ERROR", f"Failed to start server [{name}]: {type(e).__name__}: {e}")
+            if not ready.done():
+                ready.set_exception(e)
+        finally:
+            self.sessions.pop(name, None)
+            self._tools_stale = True  # the next refresh drops its tools
+            if connection is not None:
+                await connection.close()
+            elif process is not None and process.returncode is None:
+                process.terminate()
+                await process.wait()
 
 
-    async def start_stdio_servers(self, server_config):
-        if "command" in server_config and "args" in server_config:
-            name, command, args = server_config["name"], server_config["command"], server_config["args"]
-            try:
+    async def start_stdio_servers(self, server_config, ready):
+        if "command" not in server_config or "args" not in server_config:
+            self.log("WARNING", f"Server [{server_config.get('name')}] doesnt have command/args so it will be skipped")
+            ready.set_exception(ValueError("missing command/args"))
+            return
+        name, command, args = server_config["name"], server_config["command"], server_config["args"]
+        try:
+            async with AsyncExitStack() as stack:
                 server_params = StdioServerParameters(
                     command=command, args=args,
                 )
                 client_context = stdio_client(server_params)
                 # I/O streams
-                streams = await self._stack.enter_async_context(client_context)
+                streams = await stack.enter_async_context(client_context)
                 read, write, *rest = streams
                 
-                session_cmgr = ClientSession(read, write)
-                session = await self._stack.enter_async_context(session_cmgr)
+                session_cmgr = ClientSession(read, write, message_handler=self._message_handler(name))
+                session = await stack.enter_async_context(session_cmgr)
                 self.log("INIT", f"Server [{name}] client session set up, now waiting to initialize")
-                await asyncio.sleep(1.0)
-                if hasattr(session, "initialize"):
-                    self.log("DEBUG", f"Server [{name}] starting initialization...")
-                    await session.initialize()
+                await session.initialize()
                         
                 self.sessions[name] = session
                 self.log("ONLINE", f"Server [{name}] is online and initialized!")
-                print(f"[{name}] - Online")
-            except Exception as e:
-                self.log("ERROR", f"Failed to start server [{name}]: {e}")
-                print(f"[{name}] - Offline")
-        else:
-            self.log("WARNING", f"Server [{name}] doesnt have command/args so it will be skipped")
-            print(f"[{name}] - Offline")
+                if not ready.done():
+                    ready.set_result(session)
+                await self._shutdown.wait()
+        except Exception as e:
+            self.log("ERROR", f"Failed to start server [{name}]: {e}")
+            if not ready.done():
+                ready.set_exception(e)
+        finally:
+            self.sessions.pop(name, None)
+            self._tools_stale = True  # the next refresh drops its tools
 
 
     async def stop_servers(self):
         try:
-            await self._stack.aclose() 
-            self.log("CLOESD", f"closed stack successfully")
+            self._shutdown.set()
+            # Every server task closes its own transport
+            results = await asyncio.gather(*self._server_tasks.values(), return_exceptions=True)
+            for name, result in zip(self._server_tasks, results):
+                if isinstance(result, Exception):
+                    self.log("ERROR", f"Server [{name}] failed while closing: {result}")
+            self._server_tasks.clear()
+            self.log("CLOESD", f"closed servers successfully")
         except Exception as e:
-            self.log("ERROR", f"Failed to close stack: {e}")
\ No newline at end of file
+            self.log("ERROR", f"Failed to close servers: {e}")
+        finally:
+            await asyncio.to_thread(self.logger.close)
\ No newline at end of file